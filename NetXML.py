@@ -37,10 +37,57 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 __version__ = "0.1.0"
 
+import io
 import os
+import sys
+import bz2
+import glob
+import gzip
+import lzma
+import math
+import array
+import heapq
+import pickle
+import hashlib
+import tempfile
+import mmap
+import time
+import queue
+import asyncio
+import threading
 import datetime
+import operator
+import struct
+import zlib
+import logging
+import functools
+import collections
+import multiprocessing
 import xml.etree.ElementTree as ET
 
+try:
+    import lxml.etree as LET
+except ImportError:
+    LET = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_logger = logging.getLogger(__name__)
+
+# Element types accepted by the populate_from_Element methods
+if LET is None:
+    _ELEMENT_TYPES = (ET.Element, ET.ElementTree)
+else:
+    _ELEMENT_TYPES = (ET.Element, ET.ElementTree, LET._Element, LET._ElementTree)
+
 ################################################################################
 def _qsplit(tagname):
     """ Returns namespace and local tag name as a pair. """
@@ -100,11 +147,91 @@ def _boolcast(val):
     elif val in [False, "False", "false"]:
         return False
 
+_KISMET_DAYS = set(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+
+_KISMET_MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+                  "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Number of distinct timestamp strings remembered by the date parsers
+_DATE_CACHE_SIZE = 4096
+
+def _kismet_time(val):
+    """ Parse a Kismet timestamp (e.g., "Wed May  6 08:23:31 2015"). The
+        fixed layout is sliced directly, anything else uses strptime. """
+    if (len(val) == 24 and val[3] == " " and val[7] == " " and
+            val[10] == " " and val[13] == ":" and val[16] == ":" and
+            val[19] == " " and val[0:3] in _KISMET_DAYS):
+        month = _KISMET_MONTHS.get(val[4:7])
+        if month is not None:
+            try:
+                return datetime.datetime(int(val[20:24]), month,
+                                         int(val[8:10]), int(val[11:13]),
+                                         int(val[14:16]), int(val[17:19]))
+            except ValueError:
+                pass
+    return datetime.datetime.strptime(val, "%a %b  %d %H:%M:%S %Y")
+
+@functools.lru_cache(maxsize=_DATE_CACHE_SIZE)
 def _datecast(val):
     """ Convert string time value to datetime object. """
     if val is None:
         return None
-    return datetime.datetime.strptime(val, "%a %b  %d %H:%M:%S %Y")
+    return _kismet_time(val)
+
+@functools.lru_cache(maxsize=_DATE_CACHE_SIZE)
+def _epochcast(val):
+    """ Convert string time value to integer seconds since the epoch. """
+    if val is None:
+        return None
+    return int((_kismet_time(val) - _EPOCH).total_seconds())
+
+@functools.lru_cache(maxsize=_DATE_CACHE_SIZE)
+def _fromepoch(val):
+    """ Convert integer seconds since the epoch to a datetime object. """
+    return _EPOCH + datetime.timedelta(seconds=val)
+
+def _dateget(value):
+    """ Return a timestamp as datetime, materialising stored epoch values. """
+    if value.__class__ is int:
+        return _fromepoch(value)
+    return value
+
+def _maccast(val):
+    """ Convert a MAC address to a 48-bit integer. Values that are not MAC
+        addresses are kept as strings. """
+    mac = _mac_int(val)
+    if mac is None:
+        return val
+    return mac
+
+def _macget(value):
+    """ Return a MAC address as colon-hex, formatting stored integers. """
+    if value.__class__ is int:
+        return int_to_mac(value)
+    return value
+
+def int_to_mac(value):
+    """ Format a 48-bit integer as an upper case colon-hex MAC address. """
+    digits = "%012X" % value
+    return "%s:%s:%s:%s:%s:%s" % (digits[0:2], digits[2:4], digits[4:6],
+                                  digits[6:8], digits[8:10], digits[10:12])
+
+def mac_to_int(mac):
+    """ Convert a MAC address in any common format to a 48-bit integer, e.g.,
+        for sorting or joining records by MAC address. Raises ValueError if
+        mac is not a MAC address. """
+    value = _mac_int(mac)
+    if value is None:
+        raise ValueError("Not a MAC address: %r" % (mac,))
+    return value
+
+def _symbolcast(val):
+    """ Intern a string, so equal values share one object. Preserves nulls. """
+    if val is None:
+        return None
+    return sys.intern(val)
     
 ################################################################################
 class NetXML(object):
@@ -115,6 +242,9 @@ class NetXML(object):
         self.card_source = None
         self._WirelessNetworks = []
         self._WirelessClients = []
+        self._merged = None
+        self._indexes = {}
+        self._spatial = None
 
     def __iter__(self):
         """ Yields all wireless networks (wn) and wireless clients (wc) """
@@ -128,10 +258,160 @@ class NetXML(object):
     def append(self, value):
         if isinstance(value, WirelessNetwork):
             self._WirelessNetworks.append(value)
+            if self._merged is not None:
+                _merge_key(self._merged[0], _merge_mac(value._bssid), value)
+                _merge_clients(self._merged[1], value)
         elif isinstance(value, WirelessClient):
             self._WirelessClients.append(value)
+            if self._merged is not None:
+                _merge_key(self._merged[1], _merge_mac(value._client_mac),
+                           value)
+        else:
+            raise TypeError("Expecting: WirelessNetwork or Wirelessclient; Got %r." % type(value))
+        self._reindex_changed(value, {})
+
+    def _index_state(self, value):
+        """ Return the indexed values and GPS position of a record and its
+            clients, by record id, see _reindex_changed. """
+        state = {}
+        if self._indexes or self._spatial is not None:
+            for record in _with_clients(value):
+                state[id(record)] = ([_index_value(field, record)
+                                      for field in self._indexes],
+                                     _record_point(record))
+        return state
+
+    def _reindex_changed(self, value, state):
+        """ Update the built indexes and spatial index for a record and its
+            clients, moving only the entries whose value differs from state
+            (from _index_state). Records missing from state are added. """
+        if not self._indexes and self._spatial is None:
+            return
+        for record in _with_clients(value):
+            (values, point) = state.get(id(record),
+                                        ([None] * len(self._indexes), None))
+            for ((field, index), old) in zip(self._indexes.items(), values):
+                new = _index_value(field, record)
+                if new != old:
+                    _index_discard(index, old, record)
+                    _index_add(index, new, record)
+            if self._spatial is not None:
+                new = _record_point(record)
+                if new != point:
+                    self._spatial.discard(record, point)
+                    self._spatial.add(record)
+
+    def _index(self, field):
+        """ Return the index of field, building it on first use. """
+        index = self._indexes.get(field)
+        if index is None:
+            if field not in _INDEXED:
+                raise ValueError("Unknown NetXML index: %r" % field)
+            index = {}
+            for record in self:
+                _index_record(index, field, record)
+            self._indexes[field] = index
+        return index
+
+    def reindex(self):
+        """ Discard all indexes, required after modifying records in place. """
+        self._indexes = {}
+        self._spatial = None
+
+    def to_columns(self):
+        """ Return the records as NumPy columns, see iterparse columnar. """
+        builder = _ColumnBuilder()
+        for wn in self._WirelessNetworks:
+            builder.add_network(wn)
+        for wc in self._WirelessClients:
+            builder.add_client(wc, None)
+        return builder.columns()
+
+    def to_store(self, path):
+        """ Write the records to a ColumnStore file, see open_store. """
+        builder = _ColumnBuilder()
+        for wn in self._WirelessNetworks:
+            builder.add_network(wn)
+        for wc in self._WirelessClients:
+            builder.add_client(wc, None)
+        builder.write(path)
+
+    def spatial_index(self):
+        """ Return a SpatialIndex of all records, building it on first use. """
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self)
+        return self._spatial
+
+    def by_bssid(self, bssid):
+        """ Return the WirelessNetwork with bssid, or None. """
+        records = self._index("bssid").get(bssid)
+        return next(iter(records.values())) if records else None
+
+    def by_client_mac(self, client_mac):
+        """ Return the WirelessClient with client_mac, or None. """
+        records = self._index("client_mac").get(client_mac)
+        return next(iter(records.values())) if records else None
+
+    def where(self, **criteria):
+        """ Return the WirelessNetworks and WirelessClients matching every
+            criterion, e.g., where(channel=6, privacy="WEP"). Criteria are
+            any of bssid, client_mac, channel, privacy, manuf and essid. """
+        if not criteria:
+            return list(self)
+        buckets = [self._index(field).get(value, {})
+                   for (field, value) in criteria.items()]
+        buckets.sort(key=len)
+        others = buckets[1:]
+        return [record for (key, record) in buckets[0].items()
+                if all(key in other for other in others)]
+
+    def merge(self, value):
+        """ Fold a WirelessNetwork (WirelessClient) observation into the
+            record with the same bssid (client_mac), appending a copy of it if
+            that bssid (client_mac) has not been seen, so merged records never
+            share state with their source. A WirelessClient is folded into a
+            client with the same client_mac under any network, while the
+            clients of a WirelessNetwork are merged with the clients of the
+            same network. Given a NetXML object, merges all of its records.
+            Returns the merged record. """
+        if isinstance(value, NetXML):
+            for record in value._WirelessNetworks + value._WirelessClients:
+                self.merge(record)
+            return self
+        (networks, clients) = self._merge_index()
+        if isinstance(value, WirelessNetwork):
+            (index, key, fold) = (networks, _merge_mac(value._bssid),
+                                  _merge_network)
+        elif isinstance(value, WirelessClient):
+            (index, key, fold) = (clients, _merge_mac(value._client_mac),
+                                  _merge_client)
         else:
             raise TypeError("Expecting: WirelessNetwork or Wirelessclient; Got %r." % type(value))
+        record = index.get(key) if key is not None else None
+        if record is None:
+            record = _merge_copy(value)
+            self.append(record)
+            return record
+        if record is not value:
+            # Only the index entries of the folded record and its clients
+            # whose value changes are updated
+            state = self._index_state(record)
+            fold(record, value)
+            self._reindex_changed(record, state)
+            if fold is _merge_network:
+                _merge_clients(clients, record)
+        return record
+
+    def _merge_index(self):
+        """ Lazily build the bssid and client_mac indexes used by merge. """
+        if self._merged is None:
+            self._merged = ({}, {})
+            for wn in self._WirelessNetworks:
+                _merge_key(self._merged[0], _merge_mac(wn._bssid), wn)
+                _merge_clients(self._merged[1], wn)
+            for wc in self._WirelessClients:
+                _merge_key(self._merged[1], _merge_mac(wc._client_mac), wc)
+        return self._merged
 
 ################################################################################
 class CardSource(object):
@@ -148,7 +428,7 @@ class CardSource(object):
                            "card_channels"])
 
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["card-source"]
         for ce in e.findall("./*"):
@@ -160,8 +440,33 @@ class CardSource(object):
 
 ################################################################################
 class WirelessNetwork(object):
+    __slots__ = ("_number",
+                 "_network_type",
+                 "_first_time",
+                 "_last_time",
+                 "_freqmhz",
+                 "_encryption",
+                 "_ssid",
+                 "_packets",
+                 "_snr",
+                 "_gps",
+                 "_WirelessClients",
+                 "_bssid",
+                 "_bsstimestamp",
+                 "_carrier",
+                 "_cdp_device",
+                 "_cdp_portid",
+                 "_channel",
+                 "_datasize",
+                 "_encoding",
+                 "_manuf",
+                 "_maxseenrate",
+                 "source",
+                 "_pending")
+
+    netxml_type = "network"
+
     def __init__(self, **kwargs):
-        self.netxml_type = "network"
         self.number = kwargs.get("number")
         self.network_type = kwargs.get("type")
         self.first_time = _datecast(kwargs.get("first-time"))
@@ -173,28 +478,23 @@ class WirelessNetwork(object):
         self._snr = None
         self._gps = None
         self._WirelessClients = list()
+        # NetXML file the network was parsed from
+        self.source = None
+        self._pending = None
         
         # Initialise WirelessNetwork attributes
         for prop in self._all_properties:
             setattr(self, prop, kwargs.get(prop))
-        # Initialise SSID object
-        for prop in SSIDObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))
-        # Initialise Packets object
-        for prop in PacketsObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))            
-        # Initialise SnrInfo object
-        for prop in SnrInfoObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))
-        # Initialise GPS object
-        for prop in GPSInfoObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))                        
 
     def __iter__(self):
         """ Yields all WirelessClients. """
         for f in self._WirelessClients:
             yield f
 
+    def __getattr__(self, name):
+        """ Only called for unset slots, i.e., sub-objects not yet decoded. """
+        return _undefer(self, name)
+
     _all_properties = set(["bssid",
                            "bsstimestamp",
                            "carrier",
@@ -208,65 +508,20 @@ class WirelessNetwork(object):
 
     def populate_from_Element(self, e):
         # Populate object from ET element
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["wireless-network"]
-        for ce in e.findall("./*"):
-            # Find all properties for Wireless Network
-            (cns, ctn) = _qsplit(ce.tag)
-            ctn = ctn.lower()
-            if "-" in ctn:
-                ctn = ctn.replace("-", "_")
-            
-            # Parse the SSID element and children
-            if ctn == "ssid":
-                ssid = SSIDObject(**e.attrib)
-                ssid.populate_from_Element(ce)
-                self._ssid = ssid            
-                                
-            # Parse the packets element and children
-            elif ctn == "packets":
-                packets = PacketsObject(**e.attrib)
-                packets.populate_from_Element(ce)
-                self._packets = packets                  
-            
-            # Parse the snr-info (signal) element and children
-            elif ctn == "snr_info":
-                snr = SnrInfoObject(**e.attrib)
-                snr.populate_from_Element(ce)
-                self._snr = snr                    
-                
-            # Parse the GPS element and children
-            elif ctn == "gps_info":
-                gps = GPSInfoObject(**e.attrib)
-                gps.populate_from_Element(ce)
-                self._gps = gps                   
-                
-            # Parse any attached Wireless Clients
-            elif ctn == "wireless_client":
-                #wc = WirelessClient(**e.attrib)
-                # Above was removed, fetched network attributes, not client!
-                wc = WirelessClient()
-                wc.populate_from_Element(ce, self.number)
-                self._WirelessClients.append(wc)
-                                
-            elif ctn == "freqmhz":
-                self._freqmhz.append(ce.text)
-            
-            elif ctn in WirelessNetwork._all_properties:
-                setattr(self, ctn, ce.text)
-        
-        # After looping all XML tags, if there is no SSID
-        # object, create an empty one      
-        if self.ssid == None:
-            ssid = SSIDObject(**e.attrib)
-            ssid.populate_empty_object()
-            self._ssid = ssid
+        _DECODER.populate_network(self, e)
 
     # WirelessNetwork property getters and setters
     @property
     def bssid(self):
-        return self._bssid
+        return _macget(self._bssid)
+
+    @property
+    def bssid_int(self):
+        """ The BSSID as a 48-bit integer, or None. """
+        return _mac_int(self._bssid)
 
     @bssid.setter
     def bssid(self, value):
@@ -330,7 +585,7 @@ class WirelessNetwork(object):
 
     @property
     def first_time(self):
-        return self._first_time
+        return _dateget(self._first_time)
 
     @first_time.setter
     def first_time(self, value):
@@ -349,7 +604,7 @@ class WirelessNetwork(object):
 
     @property
     def last_time(self):
-        return self._last_time
+        return _dateget(self._last_time)
 
     @last_time.setter
     def last_time(self, value):
@@ -401,8 +656,34 @@ class WirelessNetwork(object):
         
 ################################################################################
 class WirelessClient(object):
+    __slots__ = ("_number",
+                 "type",
+                 "_first_time",
+                 "_last_time",
+                 "_ssid",
+                 "_freqmhz",
+                 "_encryption",
+                 "_packets",
+                 "_snr",
+                 "_gps",
+                 "network_number",
+                 "_client_mac",
+                 "_client_manuf",
+                 "_channel",
+                 "_maxseenrate",
+                 "_datasize",
+                 "_encoding",
+                 "_carrier",
+                 "_cdp_device",
+                 "_cdp_portid",
+                 "_manuf",
+                 "_network_type",
+                 "source",
+                 "_pending")
+
+    netxml_type = "client"
+
     def __init__(self, **kwargs):
-        self.netxml_type = "client"
         # Initially, set attribute to None
         self.number = None
         self.type = None
@@ -410,26 +691,29 @@ class WirelessClient(object):
         self.last_time = None
         # Initialise client XML child elements
         self._ssid = None
+        self._packets = None
+        self._snr = None
+        self._gps = None
         self._freqmhz = list()
         self._encryption = list()
         # Initially, set parent network number to None
         self.network_number = None        
+        # Properties without a matching wireless-client XML element
+        self.cdp_device = None
+        self.cdp_portid = None
+        self.manuf = None
+        self.network_type = None
+        # NetXML file the client was parsed from
+        self.source = None
+        self._pending = None
         
         # Initialise WirelessClient attributes
         for prop in self._all_properties:
             setattr(self, prop, kwargs.get(prop))
-        # Initialise SSID object
-        for prop in SSIDObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))
-        # Initialise Packets object
-        for prop in PacketsObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))            
-        # Initialise SnrInfo object
-        for prop in SnrInfoObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))
-        # Initialise GPS object
-        for prop in GPSInfoObject._all_properties:
-            setattr(self, prop, kwargs.get(prop))
+
+    def __getattr__(self, name):
+        """ Only called for unset slots, i.e., sub-objects not yet decoded. """
+        return _undefer(self, name)
 
     # All possible WirelessClient XML elements
     _all_properties = set(["client_mac",
@@ -448,68 +732,12 @@ class WirelessClient(object):
 
     def populate_from_Element(self, e, number):
         # Populate a WirelessClient object from given ET element
-        # Set parent network number to supplied number
-        self.network_number = number
         # Check we have an ET element
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         # Split XML tag and check we have a "wireless-client"
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["wireless-client"]
-        
-        # Parse wireless-client attributes
-        for attrib in e.attrib:
-            if attrib in WirelessClient._all_attributes:
-                if "-" in attrib:
-                    attrib_fix = attrib.replace("-", "_")  
-                    setattr(self, attrib_fix, e.get(attrib))
-                else:
-                    setattr(self, attrib, e.get(attrib))
-
-        # Parse wireless-client XML tags
-        for ce in e.findall("./*"):
-            (cns, ctn) = _qsplit(ce.tag)
-            ctn = ctn.lower()
-            if "-" in ctn:
-                ctn = ctn.replace("-", "_")
-            
-            # Parse the SSID element and children
-            if ctn == "ssid":
-                ssid = SSIDObject(**e.attrib)
-                ssid.populate_from_Element(ce)
-                self._ssid = ssid            
-                                
-            # Parse the packets element and children
-            elif ctn == "packets":
-                packets = PacketsObject(**e.attrib)
-                packets.populate_from_Element(ce)
-                self._packets = packets                  
-            
-            # Parse the snr-info (signal) element and children
-            elif ctn == "snr_info":
-                snr = SnrInfoObject(**e.attrib)
-                snr.populate_from_Element(ce)
-                self._snr = snr                    
-                
-            # Parse the GPS element and children
-            elif ctn == "gps_info":
-                gps = GPSInfoObject(**e.attrib)
-                gps.populate_from_Element(ce)
-                self._gps = gps
-            
-            # Parse client frequency, may be multiple, so append to list
-            elif ctn == "freqmhz":
-                self._freqmhz.append(ce.text)
-
-            # Parse all remaining wireless-client properties
-            elif ctn in WirelessClient._all_properties:
-                setattr(self, ctn, ce.text)            
-
-        # After looping all XML tags, if there is no SSID
-        # object, create an empty one      
-        if self._ssid == None:
-            ssid = SSIDObject(**e.attrib)
-            ssid.populate_empty_object()
-            self._ssid = ssid
+        _DECODER.populate_client(self, e, number)
             
     # WirelessClient property getters and setters
     @property
@@ -546,7 +774,12 @@ class WirelessClient(object):
         
     @property
     def client_mac(self):
-        return self._client_mac
+        return _macget(self._client_mac)
+
+    @property
+    def client_mac_int(self):
+        """ The client MAC address as a 48-bit integer, or None. """
+        return _mac_int(self._client_mac)
 
     @client_mac.setter
     def client_mac(self, value):
@@ -578,7 +811,7 @@ class WirelessClient(object):
 
     @property
     def first_time(self):
-        return self._first_time
+        return _dateget(self._first_time)
 
     @first_time.setter
     def first_time(self, value):
@@ -597,7 +830,7 @@ class WirelessClient(object):
 
     @property
     def last_time(self):
-        return self._last_time
+        return _dateget(self._last_time)
 
     @last_time.setter
     def last_time(self, value):
@@ -649,6 +882,23 @@ class WirelessClient(object):
 
 ################################################################################
 class SSIDObject(object):
+    __slots__ = ("number",
+                 "_first_time",
+                 "_last_time",
+                 "_encryption",
+                 "_beaconrate",
+                 "_cloaked",
+                 "_essid",
+                 "_frame_type",
+                 "_info",
+                 "_max_rate",
+                 "_packets",
+                 "wpa_version",
+                 "wps",
+                 "_privacy",
+                 "_cipher",
+                 "_authentication")
+
     def __init__(self, **kwargs):
         self.number = kwargs.get("number")
         self.first_time = _datecast(kwargs.get("first-time"))
@@ -678,43 +928,10 @@ class SSIDObject(object):
 
     # SSID Population from ET element
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["SSID"]
-        for ce in e.findall("./*"):
-            (cns, ctn) = _qsplit(ce.tag)
-            if "-" in ctn:
-                ctn = ctn.replace("-", "_")
-            if "type" in ctn:
-                ctn = "frame_type"
-            # Determine ESSID informaiton
-            if ctn == "essid":
-                # Determine if network is cloaked
-                if "cloaked" not in ce.attrib:
-                    self.cloaked = False
-                else:
-                    self.cloaked = ce.attrib["cloaked"]
-                if ce.text == "":
-                    self.essid = None
-                else:
-                    self.essid = ce.text
-            # Sometimes ESSID is stored in SSID element
-            elif ctn == "ssid":
-                self.essid = ce.text
-            elif ctn == "wpa_version":
-                self.wpa_version = ce.text
-            # Append encryption to be later parsed
-            elif ctn == "encryption":
-                self._encryption.append(ce.text)
-            # Check if network has WPS enabled
-            elif ctn == "wps":
-                self.wps = ce.text
-            # Populate all other elements
-            elif ctn in self._all_properties:
-                setattr(self, ctn, ce.text)
-        
-        # All encryption elements stored, no parse them
-        self.determine_encryption()
+        _DECODER.populate_ssid(self, e)
 
     def determine_encryption(self):
         """ Determine encryption by parsing the list of encryption values. The
@@ -812,7 +1029,7 @@ class SSIDObject(object):
 
     @property
     def first_time(self):
-        return self._first_time
+        return _dateget(self._first_time)
 
     @first_time.setter
     def first_time(self, value):
@@ -838,7 +1055,7 @@ class SSIDObject(object):
 
     @property
     def last_time(self):
-        return self._last_time
+        return _dateget(self._last_time)
 
     @last_time.setter
     def last_time(self, value):
@@ -872,6 +1089,13 @@ class SSIDObject(object):
 
 ##################################################################################
 class PacketsObject(object):
+    __slots__ = ("_llc",
+                 "_data",
+                 "_crypt",
+                 "_total",
+                 "_fragments",
+                 "_retries")
+
     def __init__(self, **kwargs):
         """ Initialise Packets object attributes. """
         for prop in self._all_properties:
@@ -885,15 +1109,10 @@ class PacketsObject(object):
                            "retries"])
 
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["packets"]
-        for ce in e.findall("./*"):
-            (cns, ctn) = _qsplit(ce.tag)
-            # Make element lower case as some tags (e.g., LLC ) are in caps.
-            ctn = ctn.lower()
-            if ctn in self._all_properties:
-                setattr(self, ctn, ce.text)
+        _DECODER.populate_packets(self, e)
 
     @property
     def llc(self):
@@ -945,6 +1164,19 @@ class PacketsObject(object):
 
 ################################################################################
 class SnrInfoObject(object):
+    __slots__ = ("_last_signal_dbm",
+                 "_last_noise_dbm",
+                 "_last_signal_rssi",
+                 "_last_noise_rssi",
+                 "_min_signal_dbm",
+                 "_min_noise_dbm",
+                 "_min_signal_rssi",
+                 "_min_noise_rssi",
+                 "_max_signal_dbm",
+                 "_max_noise_dbm",
+                 "_max_signal_rssi",
+                 "_max_noise_rssi")
+
     def __init__(self, **kwargs):
         """ Initialise SnrInfo object attributes. """
         for prop in self._all_properties:
@@ -964,17 +1196,10 @@ class SnrInfoObject(object):
                            "max_noise_rssi"])
 
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
-        # Split into namespace and tagname
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["snr-info"]
-        # Look through direct-child elements for other properties
-        for ce in e.findall("./*"):
-            (cns, ctn) = _qsplit(ce.tag)
-            if "-" in ctn:
-                ctn = ctn.replace("-", "_")
-            if ctn in self._all_properties:
-                setattr(self, ctn, ce.text)
+        _DECODER.populate_snr(self, e)
 
     @property
     def last_signal_dbm(self):
@@ -1073,6 +1298,21 @@ class SnrInfoObject(object):
         
 ################################################################################
 class GPSInfoObject(object):
+    __slots__ = ("_min_lat",
+                 "_min_lon",
+                 "_min_alt",
+                 "_min_spd",
+                 "_max_lat",
+                 "_max_lon",
+                 "_max_alt",
+                 "_max_spd",
+                 "_peak_lat",
+                 "_peak_lon",
+                 "_peak_alt",
+                 "_avg_lat",
+                 "_avg_lon",
+                 "_avg_alt")
+
     def __init__(self, **kwargs):
         """ Initialise GPSInfo object attributes. """
         for prop in self._all_properties:
@@ -1094,17 +1334,10 @@ class GPSInfoObject(object):
                            "avg_alt"])
 
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
-        # Split into namespace and tagname
+        _typecheck(e, _ELEMENT_TYPES)
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["gps-info"]
-        # Look through direct-child elements for other properties
-        for ce in e.findall("./*"):
-            (cns, ctn) = _qsplit(ce.tag)
-            if "-" in ctn:
-                ctn = ctn.replace("-", "_")
-            if ctn in self._all_properties:
-                setattr(self, ctn, ce.text)
+        _DECODER.populate_gps(self, e)
 
     @property
     def min_lon(self):
@@ -1230,7 +1463,7 @@ class SeenCard(object):
                            "seen_packets"])
 
     def populate_from_Element(self, e):
-        _typecheck(e, (ET.Element, ET.ElementTree))
+        _typecheck(e, _ELEMENT_TYPES)
         # Split into namespace and tagname
         (ns, tn) = _qsplit(e.tag)
         assert tn in ["seen-card"]
@@ -1269,12 +1502,1742 @@ class SeenCard(object):
         self._seen_packets = _strcast(value)    
 
 ################################################################################
-def iterparse(filename, events=("start","end"), **kwargs):
-    """ Generator. Yields a stream of populated WirelessNetworks. """
-    fh = None
-    if filename.endswith(".netxml"):
-        fh = open(filename, "rb")
-    else:
+def _ssid_privacy(record):
+    ssid = record.ssid
+    return ssid.privacy if ssid is not None else None
+
+def _ssid_essid(record):
+    ssid = record.ssid
+    return ssid.essid if ssid is not None else None
+
+# Indexed fields: (WirelessNetwork value, WirelessClient value) functions, None
+# if the record type is not indexed by the field
+_INDEXED = {"bssid": (operator.attrgetter("bssid"), None),
+            "client_mac": (None, operator.attrgetter("client_mac")),
+            "channel": (operator.attrgetter("channel"),
+                        operator.attrgetter("channel")),
+            "privacy": (_ssid_privacy, _ssid_privacy),
+            "manuf": (operator.attrgetter("manuf"),
+                      operator.attrgetter("client_manuf")),
+            "essid": (_ssid_essid, _ssid_essid)}
+
+# Index buckets are dicts of id(record) to record, in insertion order, so
+# records are added and removed in constant time
+def _index_value(field, record):
+    """ Return the value a record is indexed by in the index of field, or
+        None if it is not indexed. """
+    get = _INDEXED[field][0 if isinstance(record, WirelessNetwork) else 1]
+    if get is None:
+        return None
+    try:
+        return get(record)
+    except AttributeError:
+        # Field not decoded, see iterparse fields
+        return None
+
+def _index_add(index, value, record):
+    """ Add a record to the bucket of value. """
+    if value is not None:
+        index.setdefault(value, {})[id(record)] = record
+
+def _index_discard(index, value, record):
+    """ Remove a record from the bucket of value, if present. """
+    records = index.get(value) if value is not None else None
+    if records is None:
+        return
+    records.pop(id(record), None)
+    if not records:
+        del index[value]
+
+def _index_record(index, field, record):
+    """ Add a record to the index of field. """
+    _index_add(index, _index_value(field, record), record)
+
+def _with_clients(value):
+    """ Return a record and, for a WirelessNetwork, its clients. """
+    records = [value]
+    if isinstance(value, WirelessNetwork):
+        records.extend(_slot(value, "_WirelessClients") or ())
+    return records
+
+################################################################################
+# Mean Earth radius in metres, and metres per degree of latitude
+_EARTH_RADIUS = 6371008.8
+_METRES_PER_DEGREE = _EARTH_RADIUS * math.pi / 180.0
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """ Great-circle distance in metres between two points in degrees. """
+    (lat1, lon1, lat2, lon2) = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2.0) ** 2 + math.cos(lat1) * math.cos(lat2) *
+         math.sin((lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * _EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+def _gps_point(gps):
+    """ Return the (lat, lon, min_lat, min_lon, max_lat, max_lon) of a
+        GPSInfoObject, positioned at the average or the centre of the
+        min/max box. None if the object has no position. """
+    (min_lat, min_lon) = (_slot(gps, "_min_lat"), _slot(gps, "_min_lon"))
+    (max_lat, max_lon) = (_slot(gps, "_max_lat"), _slot(gps, "_max_lon"))
+    (lat, lon) = (_slot(gps, "_avg_lat"), _slot(gps, "_avg_lon"))
+    if lat is None or lon is None:
+        if None in (min_lat, min_lon, max_lat, max_lon):
+            return None
+        (lat, lon) = ((min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0)
+    if None in (min_lat, min_lon, max_lat, max_lon):
+        (min_lat, min_lon, max_lat, max_lon) = (lat, lon, lat, lon)
+    return (lat, lon, min(min_lat, lat), min(min_lon, lon),
+            max(max_lat, lat), max(max_lon, lon))
+
+def _lon_ranges(min_lon, max_lon):
+    """ Split a longitude range that may extend past +/-180 into ranges
+        within [-180, 180], wrapping at the antimeridian. """
+    if max_lon - min_lon >= 360.0:
+        return [(-180.0, 180.0)]
+    if min_lon < -180.0:
+        return [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    return [(min_lon, max_lon)]
+
+def _record_point(record):
+    """ Return the _gps_point of a record, or None. """
+    gps = _slot(record, "_gps")
+    return _gps_point(gps) if gps is not None else None
+
+class SpatialIndex(object):
+    """ Grid index of WirelessNetwork/WirelessClient GPS positions. Records
+        are stored in cell_size degree cells by their average position, so
+        queries only visit the cells near the query. Records without GPS
+        information are not indexed. Queries wrap at the antimeridian and
+        across the poles. """
+    def __init__(self, records=None, cell_size=0.01):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._count = 0
+        # Furthest min/max extent from a record's position, in degrees
+        self._extent_lat = 0.0
+        self._extent_lon = 0.0
+        # Occupied cell range, bounds searches for nearest
+        self._cell_range = None
+        if records is not None:
+            for record in records:
+                self.add(record)
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)),
+                int(math.floor(lon / self.cell_size)))
+
+    def add(self, record):
+        """ Index a WirelessNetwork or WirelessClient by its GPS position. """
+        point = _record_point(record)
+        if point is None:
+            return
+        (lat, lon, min_lat, min_lon, max_lat, max_lon) = point
+        cell = self._cell(lat, lon)
+        entries = self._cells.setdefault(cell, {})
+        if id(record) not in entries:
+            self._count += 1
+        entries[id(record)] = point + (record,)
+        self._extent_lat = max(self._extent_lat, lat - min_lat, max_lat - lat)
+        self._extent_lon = max(self._extent_lon, lon - min_lon, max_lon - lon)
+        if self._cell_range is None:
+            self._cell_range = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            r = self._cell_range
+            (r[0], r[1]) = (min(r[0], cell[0]), min(r[1], cell[1]))
+            (r[2], r[3]) = (max(r[2], cell[0]), max(r[3], cell[1]))
+
+    def remove(self, record):
+        """ Remove a record, which must not have moved since it was added. """
+        self.discard(record, _record_point(record))
+
+    def discard(self, record, point):
+        """ Remove a record added at point (from _gps_point), if present. The
+            extents and cell range are left as they are, which only widens
+            searches. """
+        if point is None:
+            return
+        cell = self._cell(point[0], point[1])
+        entries = self._cells.get(cell)
+        if entries is None or entries.pop(id(record), None) is None:
+            return
+        self._count -= 1
+        if not entries:
+            del self._cells[cell]
+
+    def _entries(self, min_lat, min_lon, max_lat, max_lon):
+        """ Yield the entries of every cell overlapping the box. """
+        (y0, x0) = self._cell(min_lat, min_lon)
+        (y1, x1) = self._cell(max_lat, max_lon)
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(self._cells):
+            # Box covers more cells than are occupied
+            for ((y, x), entries) in self._cells.items():
+                if y0 <= y <= y1 and x0 <= x <= x1:
+                    for entry in entries.values():
+                        yield entry
+            return
+        cells = self._cells
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                entries = cells.get((y, x))
+                if entries:
+                    for entry in entries.values():
+                        yield entry
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, extent=False):
+        """ Return the records positioned inside the box. With extent, return
+            the records whose GPS min/max box intersects the box. A box with
+            min_lon greater than max_lon crosses the antimeridian. """
+        if min_lon > max_lon:
+            ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+        else:
+            ranges = [(min_lon, max_lon)]
+        # Entries by id, a record may be found in more than one range
+        found = {}
+        for (lon0, lon1) in ranges:
+            if not extent:
+                for entry in self._entries(min_lat, lon0, max_lat, lon1):
+                    if (min_lat <= entry[0] <= max_lat and
+                            lon0 <= entry[1] <= lon1):
+                        found[id(entry)] = entry[6]
+                continue
+            for (x0, x1) in _lon_ranges(lon0 - self._extent_lon,
+                                        lon1 + self._extent_lon):
+                for entry in self._entries(min_lat - self._extent_lat, x0,
+                                           max_lat + self._extent_lat, x1):
+                    if (entry[2] <= max_lat and entry[4] >= min_lat and
+                            entry[3] <= lon1 and entry[5] >= lon0):
+                        found[id(entry)] = entry[6]
+        return list(found.values())
+
+    def within(self, lat, lon, metres):
+        """ Return (distance, record) pairs of records positioned within
+            metres of (lat, lon), nearest first. """
+        dlat = metres / _METRES_PER_DEGREE
+        coslat = math.cos(math.radians(min(90.0, abs(lat) + dlat)))
+        dlon = 180.0 if coslat <= dlat / 180.0 else min(180.0, dlat / coslat)
+        found = []
+        for (lon0, lon1) in _lon_ranges(lon - dlon, lon + dlon):
+            for entry in self._entries(lat - dlat, lon0, lat + dlat, lon1):
+                distance = _haversine(lat, lon, entry[0], entry[1])
+                if distance <= metres:
+                    found.append((distance, entry[6]))
+        found.sort(key=operator.itemgetter(0))
+        return found
+
+    def nearest(self, lat, lon, k=1):
+        """ Return (distance, record) pairs of the k records positioned
+            nearest to (lat, lon), nearest first. Searches rings of cells
+            outwards until no unsearched cell can be nearer. """
+        if not self._count or k < 1:
+            return []
+        (cy, cx) = self._cell(lat, lon)
+        (y0, x0, y1, x1) = self._cell_range
+        limit = max(cy - y0, y1 - cy, cx - x0, x1 - cx)
+        cells = self._cells
+        size = self.cell_size
+        heap = []
+
+        def visit(entries):
+            for entry in entries.values():
+                distance = _haversine(lat, lon, entry[0], entry[1])
+                item = (-distance, id(entry), entry[6])
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, item)
+
+        # Rings nearer than the occupied cells are empty
+        ring = max(0, y0 - cy, cy - y1, x0 - cx, cx - x1)
+        while ring <= limit:
+            if 8 * ring >= len(cells):
+                # Ring has more cells than are occupied, visit the rest directly
+                for ((y, x), entries) in cells.items():
+                    if max(abs(y - cy), abs(x - cx)) >= ring:
+                        visit(entries)
+                break
+            for y in range(max(cy - ring, y0), min(cy + ring, y1) + 1):
+                if y in (cy - ring, cy + ring):
+                    xs = range(max(cx - ring, x0), min(cx + ring, x1) + 1)
+                else:
+                    xs = (cx - ring, cx + ring) if ring else (cx,)
+                for x in xs:
+                    entries = cells.get((y, x))
+                    if entries:
+                        visit(entries)
+            if len(heap) == k:
+                # Nearest possible distance of any point outside the rings
+                margin_lat = min(lat - (cy - ring) * size,
+                                 (cy + ring + 1) * size - lat)
+                # Points across the antimeridian are at least as far as it
+                margin_lon = min(lon - (cx - ring) * size,
+                                 (cx + ring + 1) * size - lon,
+                                 180.0 - abs(lon))
+                coslat = math.cos(math.radians(min(90.0, abs(lat) + margin_lat)))
+                bound = min(margin_lat * _METRES_PER_DEGREE,
+                            2.0 * _EARTH_RADIUS * math.asin(min(1.0,
+                                coslat * math.sin(math.radians(margin_lon) / 2.0))))
+                if -heap[0][0] <= bound:
+                    break
+            ring += 1
+        return [(-item[0], item[2]) for item in sorted(heap, reverse=True)]
+
+################################################################################
+def _merge_key(index, key, record):
+    """ Index a record by key, the first record seen for a key is kept. """
+    if key is not None and key not in index:
+        index[key] = record
+
+def _merge_clients(index, wn):
+    """ Index the clients of a network by client_mac. """
+    for wc in _slot(wn, "_WirelessClients") or ():
+        _merge_key(index, _merge_mac(_slot(wc, "_client_mac")), wc)
+
+def _merge_mac(mac):
+    """ Return the merge key of a MAC address, its 48-bit integer, so keys
+        match regardless of case, format or compact parsing. Values that are
+        not MAC addresses are used as they are. """
+    key = _mac_int(mac)
+    if key is None:
+        return mac
+    return key
+
+def _slot(obj, slot):
+    """ Return a slot value, or None if it is unset. """
+    return getattr(obj, slot, None)
+
+def _after(a, b):
+    """ True if timestamp b is later than a, a missing a is the earliest. """
+    if b is None:
+        return False
+    if a is None:
+        return True
+    if a.__class__ is not b.__class__:
+        (a, b) = (_dateget(a), _dateget(b))
+    return b > a
+
+def _earliest(a, b):
+    """ Return the earlier of two stored timestamps, ignoring None. """
+    if a is None or b is None:
+        return b if a is None else a
+    return b if _after(b, a) else a
+
+def _latest(a, b):
+    """ Return the later of two stored timestamps, ignoring None. """
+    return b if _after(a, b) else a
+
+def _minimum(a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return b if b < a else a
+
+def _maximum(a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return b if b > a else a
+
+def _sum(a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return a + b
+
+def _copy(obj):
+    """ Shallow copy of a sub-object, so merging never modifies its source. """
+    cls = obj.__class__
+    copy = cls.__new__(cls)
+    for slot in cls.__slots__:
+        setattr(copy, slot, _slot(obj, slot))
+    return copy
+
+def _union(values, others):
+    """ Append the entries of others missing from values (list or None). """
+    if not others:
+        return values
+    if values is None:
+        return list(others)
+    for value in others:
+        if value not in values:
+            values.append(value)
+    return values
+
+def _merge_freqmhz(freqs, others):
+    """ Union of freqmhz entries, summing the packet counts of a frequency
+        seen in both (e.g., "2412 5" and "2412 3" give "2412 8"). """
+    if not others:
+        return freqs
+    if freqs is None:
+        return list(others)
+    positions = {}
+    for (i, entry) in enumerate(freqs):
+        positions[entry.partition(" ")[0] if entry else entry] = i
+    for entry in others:
+        (freq, sep, count) = entry.partition(" ") if entry else (entry, "", "")
+        i = positions.get(freq)
+        if i is None:
+            positions[freq] = len(freqs)
+            freqs.append(entry)
+            continue
+        (cur_freq, cur_sep, cur_count) = freqs[i].partition(" ") if freqs[i] else (freqs[i], "", "")
+        if count.isdigit() and cur_count.isdigit():
+            freqs[i] = "%s %d" % (freq, int(cur_count) + int(count))
+    return freqs
+
+def _merge_packets(packets, other):
+    """ Sum the PacketsObject counters. """
+    if other is None:
+        return packets
+    if packets is None:
+        return _copy(other)
+    for slot in PacketsObject.__slots__:
+        setattr(packets, slot, _sum(_slot(packets, slot), _slot(other, slot)))
+    return packets
+
+def _merge_snr(snr, other, later):
+    """ Widen the SnrInfoObject min/max extents, the last_* values come
+        from the later observation. """
+    if other is None:
+        return snr
+    if snr is None:
+        return _copy(other)
+    for slot in SnrInfoObject.__slots__:
+        (value, new) = (_slot(snr, slot), _slot(other, slot))
+        if slot.startswith("_min"):
+            value = _minimum(value, new)
+        elif slot.startswith("_max"):
+            value = _maximum(value, new)
+        elif later and new is not None or value is None:
+            value = new
+        setattr(snr, slot, value)
+    return snr
+
+def _merge_gps(gps, other, weight, other_weight, stronger):
+    """ Widen the GPSInfoObject min/max extents. Averages are weighted by
+        packet totals, the peak comes from the observation with the
+        strongest signal. """
+    if other is None:
+        return gps
+    if gps is None:
+        return _copy(other)
+    for slot in GPSInfoObject.__slots__:
+        (value, new) = (_slot(gps, slot), _slot(other, slot))
+        if slot.startswith("_min"):
+            value = _minimum(value, new)
+        elif slot.startswith("_max"):
+            value = _maximum(value, new)
+        elif slot.startswith("_peak"):
+            if stronger and new is not None or value is None:
+                value = new
+        elif value is None or new is None:
+            value = new if value is None else value
+        else:
+            value = ((value * weight + new * other_weight) /
+                     float(weight + other_weight))
+        setattr(gps, slot, value)
+    return gps
+
+def _merge_ssid(ssid, other):
+    """ Merge SSIDObject times, beacon counts and encryption, then derive
+        privacy, cipher and authentication again. """
+    if other is None:
+        return ssid
+    if ssid is None:
+        ssid = _copy(other)
+        ssid._encryption = _union(None, _slot(other, "_encryption"))
+        return ssid
+    ssid._first_time = _earliest(_slot(ssid, "_first_time"),
+                                 _slot(other, "_first_time"))
+    ssid._last_time = _latest(_slot(ssid, "_last_time"),
+                              _slot(other, "_last_time"))
+    ssid._packets = _sum(_slot(ssid, "_packets"), _slot(other, "_packets"))
+    ssid._encryption = _union(_slot(ssid, "_encryption"),
+                              _slot(other, "_encryption"))
+    for slot in SSIDObject.__slots__:
+        if _slot(ssid, slot) is None:
+            setattr(ssid, slot, _slot(other, slot))
+    if _slot(ssid, "_privacy") is not None and ssid._encryption is not None:
+        # Derived from the merged encryption and wpa_version
+        ssid.determine_encryption()
+    return ssid
+
+def _packet_weight(record):
+    """ Weight of an observation when averaging, its total packets. """
+    packets = _slot(record, "_packets")
+    total = _slot(packets, "_total") if packets is not None else None
+    return total if total else 1
+
+def _signal(record):
+    """ Strongest signal of an observation, for choosing the GPS peak. """
+    snr = _slot(record, "_snr")
+    return _slot(snr, "_max_signal_dbm") if snr is not None else None
+
+# Record slots folded by merge rather than filled in when missing
+_MERGED_SLOTS = set(["_first_time", "_last_time", "_freqmhz", "_encryption",
+                     "_ssid", "_packets", "_snr", "_gps", "_WirelessClients",
+                     "_datasize", "_maxseenrate", "_pending"])
+
+def _merge_record(record, other):
+    """ Fold the observation other into record, shared by networks and
+        clients. Unmerged attributes are kept unless missing. """
+    later = _after(_slot(record, "_last_time"), _slot(other, "_last_time"))
+    (signal, other_signal) = (_signal(record), _signal(other))
+    stronger = (other_signal is not None and
+                (signal is None or other_signal > signal))
+    (weight, other_weight) = (_packet_weight(record), _packet_weight(other))
+    record._first_time = _earliest(_slot(record, "_first_time"),
+                                   _slot(other, "_first_time"))
+    record._last_time = _latest(_slot(record, "_last_time"),
+                                _slot(other, "_last_time"))
+    record._freqmhz = _merge_freqmhz(_slot(record, "_freqmhz"),
+                                     _slot(other, "_freqmhz"))
+    record._encryption = _union(_slot(record, "_encryption"),
+                                _slot(other, "_encryption"))
+    record._ssid = _merge_ssid(_slot(record, "_ssid"), _slot(other, "_ssid"))
+    record._gps = _merge_gps(_slot(record, "_gps"), _slot(other, "_gps"),
+                             weight, other_weight, stronger)
+    record._snr = _merge_snr(_slot(record, "_snr"), _slot(other, "_snr"), later)
+    record._packets = _merge_packets(_slot(record, "_packets"),
+                                     _slot(other, "_packets"))
+    record._datasize = _sum(_slot(record, "_datasize"),
+                            _slot(other, "_datasize"))
+    record._maxseenrate = _maximum(_slot(record, "_maxseenrate"),
+                                   _slot(other, "_maxseenrate"))
+    for slot in record.__slots__:
+        if slot not in _MERGED_SLOTS and _slot(record, slot) is None:
+            setattr(record, slot, _slot(other, slot))
+
+def _merge_network(wn, other):
+    """ Fold a WirelessNetwork observation into wn, merging the clients of
+        both networks by client_mac. """
+    _merge_record(wn, other)
+    clients = _slot(other, "_WirelessClients")
+    if not clients:
+        return
+    if _slot(wn, "_WirelessClients") is None:
+        wn._WirelessClients = []
+    index = {}
+    for wc in wn._WirelessClients:
+        _merge_key(index, _merge_mac(_slot(wc, "_client_mac")), wc)
+    for wc in clients:
+        key = _merge_mac(_slot(wc, "_client_mac"))
+        target = index.get(key) if key is not None else None
+        if target is None:
+            wc = _merge_copy(wc)
+            wn._WirelessClients.append(wc)
+            _merge_key(index, key, wc)
+        elif target is not wc:
+            _merge_client(target, wc)
+
+def _merge_client(wc, other):
+    """ Fold a WirelessClient observation into wc. """
+    _merge_record(wc, other)
+
+def _merge_copy(record):
+    """ Copy a record with the lists and sub-objects merging folds into, so
+        folding into the copy never modifies the original record. """
+    copy = _copy(record)
+    copy._pending = None
+    for slot in ("_freqmhz", "_encryption"):
+        values = _slot(copy, slot)
+        if values is not None:
+            setattr(copy, slot, list(values))
+    for slot in ("_packets", "_snr", "_gps"):
+        value = _slot(copy, slot)
+        if value is not None:
+            setattr(copy, slot, _copy(value))
+    ssid = _slot(copy, "_ssid")
+    if ssid is not None:
+        copy._ssid = _copy(ssid)
+        encryption = _slot(ssid, "_encryption")
+        if encryption is not None:
+            copy._ssid._encryption = list(encryption)
+    if isinstance(record, WirelessNetwork):
+        clients = _slot(copy, "_WirelessClients")
+        if clients is not None:
+            copy._WirelessClients = [_merge_copy(wc) for wc in clients]
+    return copy
+
+################################################################################
+def _textint(text):
+    """ Convert element text to integer. Same result as _intcast for text. """
+    if text is None:
+        return None
+    if text.isdigit() or (text[0] == "-" and text[1:].isdigit()):
+        return int(text)
+
+def _textfloat(text):
+    """ Convert element text to float. Same result as _floatcast for text. """
+    if text is None:
+        return None
+    return float(text)
+
+class _RawElement(collections.namedtuple("_RawElement", "tag text attrib")):
+    """ Compact, detached copy of an XML element without children. """
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        if self.attrib is None:
+            return default
+        return self.attrib.get(key, default)
+
+def _capture(e):
+    """ Capture the children of e as (tag, text, attrib) tuples, detached
+        from the XML tree, so they can be decoded later. """
+    return tuple([(ce.tag, ce.text, ce.attrib or None) for ce in e])
+
+def _undefer(obj, name):
+    """ Decode a deferred sub-object of a lazily parsed record. """
+    if name != "_pending":
+        pending = obj._pending
+        if pending and name in pending:
+            (decode, capture, attrib) = pending.pop(name)
+            if not pending:
+                obj._pending = None
+            value = decode(capture, attrib)
+            setattr(obj, name, value)
+            return value
+    raise AttributeError("%r object has no attribute %r" %
+                         (type(obj).__name__, name))
+
+def _blank(cls):
+    """ Create a record object with every slot set to None. """
+    obj = cls.__new__(cls)
+    for slot in cls.__slots__:
+        setattr(obj, slot, None)
+    return obj
+
+def _normalise_lower(tag):
+    """ Tag normalisation used by wireless-network and wireless-client. """
+    return _qsplit(tag)[1].lower().replace("-", "_")
+
+def _normalise_ssid(tag):
+    """ Tag normalisation used by SSID, any *type* tag is the frame type. """
+    ctn = _qsplit(tag)[1].replace("-", "_")
+    if "type" in ctn:
+        ctn = "frame_type"
+    return ctn
+
+def _normalise_packets(tag):
+    """ Tag normalisation used by packets, some tags (e.g., LLC) are caps. """
+    return _qsplit(tag)[1].lower()
+
+def _normalise_underscore(tag):
+    """ Tag normalisation used by snr-info and gps-info. """
+    return _qsplit(tag)[1].replace("-", "_")
+
+class _TagTable(dict):
+    """ Maps a raw XML tag name to a (slot, converter) pair.
+
+        A slot of None means the converter is a handler called with
+        (obj, element, attrib); a converter of None means the element text is
+        stored as-is; (None, None) means the tag is ignored. Any tag spelling
+        not seen before is normalised once and cached. """
+    def __init__(self, fields, normalise):
+        dict.__init__(self)
+        self.fields = fields
+        self.normalise = normalise
+        # Optional function called with each object once it is populated
+        self.finish = None
+        # Seed with the usual Kismet spellings of each field
+        for name in fields:
+            for tag in (name, name.replace("_", "-"), name.upper()):
+                self[tag]
+
+    def __missing__(self, tag):
+        entry = self.fields.get(self.normalise(tag), _IGNORE)
+        self[tag] = entry
+        return entry
+
+_IGNORE = (None, None)
+
+def _populate(obj, e, table, attrib):
+    """ Populate obj from the direct children of e using a _TagTable. """
+    if e.__class__ is tuple:
+        _populate_captured(obj, e, table, attrib)
+        return
+    for ce in e:
+        (slot, conv) = table[ce.tag]
+        if slot is None:
+            if conv is not None:
+                conv(obj, ce, attrib)
+        elif conv is None:
+            setattr(obj, slot, ce.text)
+        else:
+            setattr(obj, slot, conv(ce.text))
+
+def _populate_captured(obj, capture, table, attrib):
+    """ Populate obj from children captured by _capture. """
+    for (tag, text, extra) in capture:
+        (slot, conv) = table[tag]
+        if slot is None:
+            if conv is not None:
+                conv(obj, _RawElement(tag, text, extra), attrib)
+        elif conv is None:
+            setattr(obj, slot, text)
+        else:
+            setattr(obj, slot, conv(text))
+
+# Fields that can be selected with the fields argument, by scope. A field
+# name without a scope (e.g., "bssid") belongs to the WirelessNetwork.
+_NETWORK_FIELDS = WirelessNetwork._all_properties | set(["freqmhz",
+                                                         "number",
+                                                         "network_type",
+                                                         "first_time",
+                                                         "last_time"])
+
+_CLIENT_FIELDS = WirelessClient._all_properties | set(["freqmhz",
+                                                       "number",
+                                                       "type",
+                                                       "first_time",
+                                                       "last_time"])
+
+_SSID_FIELDS = SSIDObject._all_properties | set(["number",
+                                                 "first_time",
+                                                 "last_time",
+                                                 "encryption",
+                                                 "privacy",
+                                                 "cipher",
+                                                 "authentication"])
+
+_FIELD_SCOPES = {"network": _NETWORK_FIELDS,
+                 "ssid": _SSID_FIELDS,
+                 "packets": PacketsObject._all_properties,
+                 "snr": SnrInfoObject._all_properties,
+                 "gps": GPSInfoObject._all_properties,
+                 "client": _CLIENT_FIELDS,
+                 "client.ssid": _SSID_FIELDS,
+                 "client.packets": PacketsObject._all_properties,
+                 "client.snr": SnrInfoObject._all_properties,
+                 "client.gps": GPSInfoObject._all_properties}
+
+# SSID fields that are set from other XML elements
+_SSID_SOURCES = {"essid": ("essid", "ssid"),
+                 "cloaked": ("essid", "cloaked"),
+                 "privacy": ("encryption", "wpa_version"),
+                 "cipher": ("encryption", "wpa_version"),
+                 "authentication": ("encryption", "wpa_version")}
+
+def _select_fields(fields):
+    """ Convert a collection of field names (e.g., "bssid", "ssid.essid",
+        "client.gps.avg_lat") into a dict of selected names per scope. A
+        scope name on its own (e.g., "gps" or "client") selects the whole
+        scope, stored as None. Returns None when fields is None. """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = [fields]
+    select = {}
+    for field in fields:
+        if field in _FIELD_SCOPES:
+            for scope in _FIELD_SCOPES:
+                if scope == field or scope.startswith(field + "."):
+                    select[scope] = None
+            continue
+        (scope, sep, name) = field.rpartition(".")
+        scope = scope or "network"
+        if name not in _FIELD_SCOPES.get(scope, ()):
+            raise ValueError("Unknown NetXML field: %r" % field)
+        if select.get(scope, ()) is not None:
+            select.setdefault(scope, set()).add(name)
+    return select
+
+class _Decoder(object):
+    """ Table-driven decoder that populates NetXML objects from ET elements.
+        Produces the same objects as the property setters, without the
+        per-field attribute machinery. With lazy_dates, timestamps are stored
+        as epoch integers and only converted to datetime when accessed. With
+        lazy, SSID, packets, snr-info and gps-info elements are captured and
+        only decoded when the sub-object is first accessed. With fields, only
+        the selected fields are decoded, everything else is left as None. With
+        filters, wireless-network elements that do not match are skipped.
+        With compact, MAC addresses are stored as 48-bit integers and
+        manufacturer, ESSID and encryption strings are interned. """
+    def __init__(self, lazy_dates=False, lazy=False, fields=None, filters=None,
+                 compact=False):
+        self.lazy = lazy
+        self.filters = filters
+        if lazy_dates:
+            self.datecast = _epochcast
+        else:
+            self.datecast = _datecast
+        if compact:
+            (mac, self.symbolcast) = (_maccast, _symbolcast)
+        else:
+            (mac, self.symbolcast) = (None, None)
+        self.select = _select_fields(fields)
+        self.network_attributes = self._wanted("network", _NETWORK_FIELDS)
+        self.client_attributes = self._wanted("client", _CLIENT_FIELDS)
+        self.ssid_table = self._ssid_table("ssid")
+        self.packets_table = self._scalar_table(
+            "packets", PacketsObject, _textint, _normalise_packets)
+        self.snr_table = self._scalar_table(
+            "snr", SnrInfoObject, _textint, _normalise_underscore)
+        self.gps_table = self._scalar_table(
+            "gps", GPSInfoObject, _textfloat, _normalise_underscore)
+        self.client_table = self._record_table("client",
+                                               [("client_mac", mac),
+                                                ("client_manuf", self.symbolcast),
+                                                ("channel", _textint),
+                                                ("maxseenrate", _textint),
+                                                ("datasize", _textint),
+                                                ("encoding", None),
+                                                ("carrier", None)])
+        self.network_table = self._record_table("network",
+                                                [("bssid", mac),
+                                                 ("bsstimestamp", None),
+                                                 ("carrier", None),
+                                                 ("cdp_device", None),
+                                                 ("cdp_portid", None),
+                                                 ("channel", _textint),
+                                                 ("datasize", _textint),
+                                                 ("encoding", None),
+                                                 ("manuf", self.symbolcast),
+                                                 ("maxseenrate", _textint)])
+
+    def _wanted(self, scope, names):
+        """ Return the set of selected names in scope. """
+        if self.select is None or self.select.get(scope, ()) is None:
+            return set(names)
+        return self.select.get(scope, set()) & set(names)
+
+    def _scalar_table(self, scope, cls, conv, normalise):
+        wanted = self._wanted(scope, cls._all_properties)
+        fields = dict((prop, ("_" + prop, conv)) for prop in wanted)
+        return _TagTable(fields, normalise)
+
+    def _ssid_table(self, scope):
+        wanted = self._wanted(scope, _SSID_FIELDS)
+        sources = set()
+        for name in wanted:
+            sources.update(_SSID_SOURCES.get(name, (name,)))
+        fields = {"beaconrate": ("_beaconrate", _textint),
+                  "cloaked": ("_cloaked", _boolcast),
+                  "essid": (None, self._handle_essid),
+                  "frame_type": ("_frame_type", None),
+                  "info": ("_info", None),
+                  "max_rate": ("_max_rate", _textfloat),
+                  "packets": ("_packets", _textint),
+                  # Sometimes ESSID is stored in SSID element
+                  "ssid": ("_essid", self.symbolcast),
+                  "wpa_version": ("wpa_version", self.symbolcast),
+                  "wps": ("wps", None),
+                  # Append encryption to be later parsed
+                  "encryption": (None, self._handle_encryption)}
+        fields = dict((k, v) for (k, v) in fields.items() if k in sources)
+        table = _TagTable(fields, _normalise_ssid)
+        # All encryption elements stored, now parse them
+        if wanted & set(["privacy", "cipher", "authentication"]):
+            table.finish = SSIDObject.determine_encryption
+        return table
+
+    def _record_table(self, scope, casts):
+        wanted = self._wanted(scope, _FIELD_SCOPES[scope])
+        fields = dict((prop, ("_" + prop, conv))
+                      for (prop, conv) in casts if prop in wanted)
+        if "freqmhz" in wanted:
+            fields["freqmhz"] = (None, self._handle_freqmhz)
+        if scope == "network":
+            prefix = ""
+            if any(self._wanted(name, _FIELD_SCOPES[name])
+                   for name in _FIELD_SCOPES if name.startswith("client")):
+                fields["wireless_client"] = (None, self._handle_client)
+        else:
+            prefix = scope + "."
+        table = self._ssid_table(prefix + "ssid")
+        if table.fields:
+            fields["ssid"] = (None, self._block("_ssid", self.empty_ssid, table))
+        blocks = [("packets", "_packets", "packets", PacketsObject, _textint,
+                   _normalise_packets),
+                  ("snr_info", "_snr", "snr", SnrInfoObject, _textint,
+                   _normalise_underscore),
+                  ("gps_info", "_gps", "gps", GPSInfoObject, _textfloat,
+                   _normalise_underscore)]
+        for (tag, slot, block, cls, conv, normalise) in blocks:
+            table = self._scalar_table(prefix + block, cls, conv, normalise)
+            if table.fields:
+                fields[tag] = (None, self._block(slot, _blank_factory(cls),
+                                                 table))
+        return _TagTable(fields, _normalise_lower)
+
+    # Handlers for elements that are not a plain scalar value
+    def _block(self, slot, create, table):
+        """ Handler that decodes a sub-object element into slot. """
+        def decode(e, attrib):
+            obj = create(attrib)
+            _populate(obj, e, table, attrib)
+            if table.finish is not None:
+                table.finish(obj)
+            return obj
+        if not self.lazy:
+            def handler(obj, ce, attrib):
+                setattr(obj, slot, decode(ce, attrib))
+            return handler
+        # Unset the slot so the first access reaches __getattr__
+        def handler(obj, ce, attrib):
+            pending = obj._pending
+            if pending is None:
+                pending = obj._pending = {}
+            if slot not in pending:
+                delattr(obj, slot)
+            pending[slot] = (decode, _capture(ce), attrib)
+        return handler
+
+    def _handle_freqmhz(self, obj, ce, attrib):
+        obj._freqmhz.append(ce.text)
+
+    def _handle_client(self, obj, ce, attrib):
+        if self.filters is not None and not self.filters.match_client(ce):
+            return
+        obj._WirelessClients.append(self.client(ce, obj._number))
+
+    def _handle_essid(self, obj, ce, attrib):
+        # Determine if network is cloaked
+        cloaked = ce.get("cloaked")
+        if cloaked is None:
+            obj._cloaked = False
+        else:
+            obj._cloaked = _boolcast(cloaked)
+        if ce.text == "":
+            obj._essid = None
+        elif self.symbolcast is None:
+            obj._essid = ce.text
+        else:
+            obj._essid = self.symbolcast(ce.text)
+
+    def _handle_encryption(self, obj, ce, attrib):
+        if self.symbolcast is None:
+            obj._encryption.append(ce.text)
+        else:
+            obj._encryption.append(self.symbolcast(ce.text))
+
+    # Populate existing objects
+    def _attrib(self, e):
+        # Deferred sub-objects outlive the element, so need their own copy
+        if self.lazy:
+            return dict(e.attrib)
+        return e.attrib
+
+    def populate_network(self, wn, e):
+        attrib = self._attrib(e)
+        _populate(wn, e, self.network_table, attrib)
+        # If there is no SSID element, create an empty SSID object
+        if "ssid" in self.network_table.fields:
+            if not (wn._pending and "_ssid" in wn._pending) and wn._ssid is None:
+                wn._ssid = self.empty_ssid(attrib)
+
+    def populate_client(self, wc, e, number):
+        attrib = self._attrib(e)
+        # Set parent network number to supplied number
+        wc.network_number = number
+        if "number" in attrib:
+            wc._number = _textint(attrib["number"])
+        if "type" in attrib:
+            wc.type = attrib["type"]
+        if "first-time" in attrib and "first_time" in self.client_attributes:
+            wc._first_time = self.datecast(attrib["first-time"])
+        if "last-time" in attrib and "last_time" in self.client_attributes:
+            wc._last_time = self.datecast(attrib["last-time"])
+        _populate(wc, e, self.client_table, attrib)
+        # If there is no SSID element, create an empty SSID object
+        if "ssid" in self.client_table.fields:
+            if not (wc._pending and "_ssid" in wc._pending) and wc._ssid is None:
+                wc._ssid = self.empty_ssid(attrib)
+
+    def populate_ssid(self, ssid, e):
+        _populate(ssid, e, self.ssid_table, None)
+        if self.ssid_table.finish is not None:
+            self.ssid_table.finish(ssid)
+
+    def populate_packets(self, packets, e):
+        _populate(packets, e, self.packets_table, None)
+
+    def populate_snr(self, snr, e):
+        _populate(snr, e, self.snr_table, None)
+
+    def populate_gps(self, gps, e):
+        _populate(gps, e, self.gps_table, None)
+
+    # Create new populated objects
+    def network(self, e):
+        """ Returns a WirelessNetwork, or None if e does not match filters. """
+        if self.filters is not None and not self.filters.match(e):
+            return None
+        attrib = e.attrib
+        attributes = self.network_attributes
+        wn = _blank(WirelessNetwork)
+        wn._number = _textint(attrib.get("number"))
+        if "network_type" in attributes:
+            wn._network_type = attrib.get("type")
+        if "first_time" in attributes:
+            wn._first_time = self.datecast(attrib.get("first-time"))
+        if "last_time" in attributes:
+            wn._last_time = self.datecast(attrib.get("last-time"))
+        wn._freqmhz = list()
+        wn._encryption = list()
+        wn._WirelessClients = list()
+        self.populate_network(wn, e)
+        return wn
+
+    def ssid(self, e, attrib):
+        ssid = self.empty_ssid(attrib)
+        self.populate_ssid(ssid, e)
+        return ssid
+
+    def gps(self, e):
+        gps = _blank(GPSInfoObject)
+        self.populate_gps(gps, e)
+        return gps
+
+    def client(self, e, number):
+        wc = _blank(WirelessClient)
+        wc._freqmhz = list()
+        wc._encryption = list()
+        self.populate_client(wc, e, number)
+        return wc
+
+    def empty_ssid(self, attrib):
+        ssid = _blank(SSIDObject)
+        ssid.number = attrib.get("number")
+        ssid._first_time = self.datecast(attrib.get("first-time"))
+        ssid._last_time = self.datecast(attrib.get("last-time"))
+        ssid._encryption = list()
+        return ssid
+
+def _blank_factory(cls):
+    """ Return a function creating blank cls objects, ignoring attrib. """
+    def create(attrib):
+        return _blank(cls)
+    return create
+
+_DECODER = _Decoder()
+
+# Decodes just enough of a wireless-network element for NetworkFilter
+_FILTER_DECODER = _Decoder(fields=["ssid.privacy", "gps.avg_lat", "gps.avg_lon"])
+
+class _NormalisedTags(dict):
+    """ Maps a raw wireless-network child tag to its normalised name. """
+    def __missing__(self, tag):
+        name = self[tag] = _normalise_lower(tag)
+        return name
+
+_NETWORK_TAGS = _NormalisedTags()
+
+def _match_set(values, normalise=None):
+    """ Convert filter criteria values to a set, None means no criteria. """
+    if values is None:
+        return None
+    if isinstance(values, (str, int)):
+        values = [values]
+    if normalise is not None:
+        return set(normalise(v) for v in values)
+    return set(values)
+
+# Separators removed from MAC addresses, e.g., 00:11:22, 00-11-22, 0011.22
+_MAC_SEPARATORS = str.maketrans("", "", ":-. ")
+def _mac_int(mac):
+    """ Convert a MAC address in any common format (e.g., 00:11:22:33:44:55,
+        00-11-22-33-44-55, 0011.2233.4455 or 001122334455) to a 48-bit
+        integer. Returns None if mac is not a MAC address. """
+    if mac is None:
+        return None
+    if mac.__class__ is int:
+        return mac if 0 <= mac < 1 << 48 else None
+    digits = mac.translate(_MAC_SEPARATORS)
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+def _oui_int(mac):
+    """ Convert an OUI wildcard (e.g., 00:11:22:* or 00:11:22) to a 24-bit
+        integer. Returns None if mac is not an OUI. """
+    digits = mac.rstrip("*").translate(_MAC_SEPARATORS)
+    if len(digits) != 6:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+class MACFilter(object):
+    """ A set of MAC addresses and OUI prefix wildcards (e.g., 00:11:22:*),
+        tested using the in operator. MAC addresses are normalised to 48-bit
+        integers, so any common format matches case-insensitively, and
+        lookups take constant time however many addresses are known. """
+    def __init__(self, macs=None):
+        self._macs = set()
+        self._ouis = set()
+        if isinstance(macs, (str, int)):
+            macs = [macs]
+        if macs is not None:
+            for mac in macs:
+                self.add(mac)
+
+    @classmethod
+    def from_file(cls, path):
+        """ Read a MACFilter from a text file with a MAC address or OUI
+            wildcard at the start of each line. Blank lines and lines starting
+            with # are ignored. """
+        macs = cls()
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    macs.add(line.split()[0])
+        return macs
+
+    def add(self, mac):
+        """ Add a MAC address or OUI wildcard. """
+        value = _mac_int(mac)
+        if value is not None:
+            self._macs.add(value)
+            return
+        oui = _oui_int(mac) if isinstance(mac, str) else None
+        if oui is None:
+            raise ValueError("Not a MAC address or OUI: %r" % (mac,))
+        self._ouis.add(oui)
+
+    def __contains__(self, mac):
+        value = _mac_int(mac)
+        if value is None:
+            return False
+        if value in self._macs:
+            return True
+        return bool(self._ouis) and value >> 24 in self._ouis
+
+    def __len__(self):
+        return len(self._macs) + len(self._ouis)
+
+def _mac_filter(macs):
+    """ Convert filter criteria MACs to a MACFilter, None means no criteria. """
+    if macs is None or isinstance(macs, MACFilter):
+        return macs
+    return MACFilter(macs)
+
+################################################################################
+class NetworkFilter(object):
+    """ Criteria evaluated on raw wireless-network elements during parsing, so
+        networks that do not match are never decoded. All given criteria must
+        match. BSSIDs are a MACFilter or a collection of MAC addresses and
+        OUI wildcards in any common format, since and until select networks
+        seen in that time window, and bbox is a (min_lat, min_lon, max_lat,
+        max_lon) box the average GPS position must be inside. client_macs and
+        exclude_client_macs select the wireless clients kept in matching
+        networks in the same way. """
+    def __init__(self, bssids=None, exclude_bssids=None, channels=None,
+                 privacy=None, manufs=None, network_types=None, since=None,
+                 until=None, bbox=None, client_macs=None,
+                 exclude_client_macs=None):
+        self.bssids = _mac_filter(bssids)
+        self.exclude_bssids = _mac_filter(exclude_bssids)
+        self.client_macs = _mac_filter(client_macs)
+        self.exclude_client_macs = _mac_filter(exclude_client_macs)
+        self.channels = _match_set(channels, int)
+        self.privacy = _match_set(privacy)
+        self.manufs = _match_set(manufs)
+        self.network_types = _match_set(network_types)
+        if since is not None:
+            _typecheck(since, datetime.datetime)
+        if until is not None:
+            _typecheck(until, datetime.datetime)
+        self.since = since
+        self.until = until
+        if bbox is not None:
+            bbox = tuple(float(v) for v in bbox)
+            if len(bbox) != 4:
+                raise ValueError("Not a (min_lat, min_lon, max_lat, max_lon) bbox: %r" % (bbox,))
+        self.bbox = bbox
+
+    def match(self, e):
+        """ Return True if the wireless-network element e matches. """
+        # Criteria stored as element attributes
+        if self.network_types is not None:
+            if e.get("type") not in self.network_types:
+                return False
+        if self.since is not None:
+            last_time = e.get("last-time")
+            if last_time is None or _datecast(last_time) < self.since:
+                return False
+        if self.until is not None:
+            first_time = e.get("first-time")
+            if first_time is None or _datecast(first_time) > self.until:
+                return False
+
+        # Criteria stored in child elements, last element wins
+        bssid = channel = manuf = ssid = gps = None
+        for ce in e:
+            name = _NETWORK_TAGS[ce.tag]
+            if name == "bssid":
+                bssid = ce.text
+            elif name == "channel":
+                channel = ce.text
+            elif name == "manuf":
+                manuf = ce.text
+            elif name == "ssid":
+                ssid = ce
+            elif name == "gps_info":
+                gps = ce
+
+        if self.bssids is not None and bssid not in self.bssids:
+            return False
+        if self.exclude_bssids is not None and bssid in self.exclude_bssids:
+            return False
+        if self.channels is not None:
+            if _textint(channel) not in self.channels:
+                return False
+        if self.manufs is not None:
+            if manuf not in self.manufs:
+                return False
+        if self.privacy is not None:
+            if ssid is None:
+                privacy = None
+            else:
+                privacy = _FILTER_DECODER.ssid(ssid, {}).privacy
+            if privacy not in self.privacy:
+                return False
+        if self.bbox is not None:
+            if gps is None:
+                return False
+            gps = _FILTER_DECODER.gps(gps)
+            if gps.avg_lat is None or gps.avg_lon is None:
+                return False
+            (min_lat, min_lon, max_lat, max_lon) = self.bbox
+            if not (min_lat <= gps.avg_lat <= max_lat and
+                    min_lon <= gps.avg_lon <= max_lon):
+                return False
+        return True
+
+    def match_client(self, e):
+        """ Return True if the wireless-client element e matches. """
+        if self.client_macs is None and self.exclude_client_macs is None:
+            return True
+        client_mac = None
+        for ce in e:
+            if _NETWORK_TAGS[ce.tag] == "client_mac":
+                client_mac = ce.text
+        if self.client_macs is not None and client_mac not in self.client_macs:
+            return False
+        if (self.exclude_client_macs is not None and
+                client_mac in self.exclude_client_macs):
+            return False
+        return True
+
+def _decoder(**kwargs):
+    """ Return the default decoder, or a new one for the given options. """
+    if not any(kwargs.values()):
+        return _DECODER
+    return _Decoder(**kwargs)
+
+################################################################################
+# A categorical string column, codes index categories and -1 is missing
+Categorical = collections.namedtuple("Categorical", "codes categories")
+
+# Numeric columns, stored as float64 with NaN for missing values
+_COLUMN_PACKETS = ("llc", "data", "crypt", "total", "fragments", "retries")
+_COLUMN_SNR = ("last_signal_dbm", "last_noise_dbm", "last_signal_rssi",
+               "last_noise_rssi", "min_signal_dbm", "min_noise_dbm",
+               "min_signal_rssi", "min_noise_rssi", "max_signal_dbm",
+               "max_noise_dbm", "max_signal_rssi", "max_noise_rssi")
+_COLUMN_GPS = ("min_lat", "min_lon", "min_alt", "min_spd", "max_lat",
+               "max_lon", "max_alt", "max_spd", "peak_lat", "peak_lon",
+               "peak_alt", "avg_lat", "avg_lon", "avg_alt")
+_COLUMN_NUMBERS = (("number", "network_number", "channel", "maxseenrate",
+                    "datasize") +
+                   tuple("packets_" + name for name in _COLUMN_PACKETS) +
+                   _COLUMN_SNR + _COLUMN_GPS)
+
+# Timestamp columns, stored as datetime64[s] with NaT for missing values
+_COLUMN_TIMES = ("first_time", "last_time")
+
+# String columns, stored as Categorical
+_COLUMN_STRINGS = ("netxml_type", "network_type", "bssid", "client_mac",
+                   "manuf", "essid", "privacy")
+
+_NAN = float("nan")
+_NAT = -2 ** 63
+
+def _number_positions(names, prefix=""):
+    """ Map tag names to their position in a numeric column row. """
+    return dict((name, _COLUMN_NUMBERS.index(prefix + name)) for name in names)
+
+_ROW_NUMBERS = _number_positions(("channel", "maxseenrate", "datasize"))
+_ROW_PACKETS = _number_positions(_COLUMN_PACKETS, "packets_")
+_ROW_SNR = _number_positions(_COLUMN_SNR)
+_ROW_GPS = _number_positions(_COLUMN_GPS)
+_ROW_BLOCKS = (("_packets", _ROW_PACKETS), ("_snr", _ROW_SNR),
+               ("_gps", _ROW_GPS))
+
+# Decodes just the SSID values stored in columns
+_COLUMN_DECODER = _Decoder(fields=["ssid.essid", "ssid.privacy"])
+
+def _column_number(text):
+    """ Convert element text to a float column value. """
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return _NAN
+
+def _column_time(value):
+    """ Convert a stored timestamp to epoch seconds, or NaT. """
+    if value is None:
+        return _NAT
+    if value.__class__ is int:
+        return value
+    return int((value - _EPOCH).total_seconds())
+
+class _ColumnBuilder(object):
+    """ Accumulates one row per WirelessNetwork/WirelessClient in flat typed
+        arrays, converted to NumPy columns by columns(). With filters (a
+        NetworkFilter), only the matching clients of each network are added. """
+    def __init__(self, filters=None):
+        self.filters = filters
+        self._numbers = array.array("d")
+        self._times = array.array("q")
+        self._codes = array.array("l")
+        self._categories = [{} for name in _COLUMN_STRINGS]
+        self._empty = [_NAN] * len(_COLUMN_NUMBERS)
+
+    def _append(self, numbers, first_time, last_time, strings):
+        self._numbers.extend(numbers)
+        self._times.append(first_time)
+        self._times.append(last_time)
+        for (categories, value) in zip(self._categories, strings):
+            if value is None:
+                self._codes.append(-1)
+                continue
+            code = categories.get(value)
+            if code is None:
+                code = categories[value] = len(categories)
+            self._codes.append(code)
+
+    def _add_block(self, numbers, e, positions):
+        for ce in e:
+            i = positions.get(_NETWORK_TAGS[ce.tag])
+            if i is not None:
+                numbers[i] = _column_number(ce.text)
+
+    def add_element(self, e):
+        """ Add a wireless-network element and its wireless-clients. """
+        attrib = e.attrib
+        numbers = list(self._empty)
+        numbers[0] = _column_number(attrib.get("number"))
+        (bssid, manuf, ssid, clients) = (None, None, None, [])
+        for ce in e:
+            name = _NETWORK_TAGS[ce.tag]
+            i = _ROW_NUMBERS.get(name)
+            if i is not None:
+                numbers[i] = _column_number(ce.text)
+            elif name == "bssid":
+                bssid = ce.text
+            elif name == "manuf":
+                manuf = ce.text
+            elif name == "ssid":
+                ssid = ce
+            elif name == "packets":
+                self._add_block(numbers, ce, _ROW_PACKETS)
+            elif name == "snr_info":
+                self._add_block(numbers, ce, _ROW_SNR)
+            elif name == "gps_info":
+                self._add_block(numbers, ce, _ROW_GPS)
+            elif name == "wireless_client":
+                if self.filters is None or self.filters.match_client(ce):
+                    clients.append(ce)
+        (essid, privacy) = self._ssid_strings(ssid)
+        self._append(numbers, _column_time(_epochcast(attrib.get("first-time"))),
+                     _column_time(_epochcast(attrib.get("last-time"))),
+                     ("network", attrib.get("type"), bssid, None, manuf, essid,
+                      privacy))
+        for ce in clients:
+            self._add_client_element(ce, numbers[0], bssid)
+
+    def _add_client_element(self, e, network_number, bssid):
+        attrib = e.attrib
+        numbers = list(self._empty)
+        numbers[0] = _column_number(attrib.get("number"))
+        numbers[1] = network_number
+        (client_mac, manuf, ssid) = (None, None, None)
+        for ce in e:
+            name = _NETWORK_TAGS[ce.tag]
+            i = _ROW_NUMBERS.get(name)
+            if i is not None:
+                numbers[i] = _column_number(ce.text)
+            elif name == "client_mac":
+                client_mac = ce.text
+            elif name == "client_manuf":
+                manuf = ce.text
+            elif name == "ssid":
+                ssid = ce
+            elif name == "packets":
+                self._add_block(numbers, ce, _ROW_PACKETS)
+            elif name == "snr_info":
+                self._add_block(numbers, ce, _ROW_SNR)
+            elif name == "gps_info":
+                self._add_block(numbers, ce, _ROW_GPS)
+        (essid, privacy) = self._ssid_strings(ssid)
+        self._append(numbers, _column_time(_epochcast(attrib.get("first-time"))),
+                     _column_time(_epochcast(attrib.get("last-time"))),
+                     ("client", attrib.get("type"), bssid, client_mac, manuf,
+                      essid, privacy))
+
+    def _ssid_strings(self, e):
+        if e is None:
+            return (None, None)
+        ssid = _COLUMN_DECODER.ssid(e, e.attrib)
+        return (ssid._essid, ssid._privacy)
+
+    def _record_numbers(self, record):
+        numbers = list(self._empty)
+        for (name, i) in _ROW_NUMBERS.items():
+            value = _slot(record, "_" + name)
+            if value is not None:
+                numbers[i] = float(value)
+        for (slot, positions) in _ROW_BLOCKS:
+            block = _slot(record, slot)
+            if block is None:
+                continue
+            for (name, i) in positions.items():
+                value = _slot(block, "_" + name)
+                if value is not None:
+                    numbers[i] = float(value)
+        number = _slot(record, "_number")
+        numbers[0] = _NAN if number is None else float(number)
+        return numbers
+
+    def _record_strings(self, record):
+        ssid = _slot(record, "_ssid")
+        if ssid is None:
+            return (None, None)
+        return (_slot(ssid, "_essid"), _slot(ssid, "_privacy"))
+
+    def add_network(self, wn):
+        """ Add a WirelessNetwork object and its WirelessClients. """
+        numbers = self._record_numbers(wn)
+        bssid = _macget(_slot(wn, "_bssid"))
+        self._append(numbers, _column_time(_slot(wn, "_first_time")),
+                     _column_time(_slot(wn, "_last_time")),
+                     ("network", _slot(wn, "_network_type"), bssid, None,
+                      _slot(wn, "_manuf")) + self._record_strings(wn))
+        for wc in wn._WirelessClients:
+            self.add_client(wc, bssid)
+
+    def add_client(self, wc, bssid):
+        """ Add a WirelessClient object of the network with bssid. """
+        numbers = self._record_numbers(wc)
+        network_number = _slot(wc, "network_number")
+        numbers[1] = _NAN if network_number is None else float(network_number)
+        self._append(numbers, _column_time(_slot(wc, "_first_time")),
+                     _column_time(_slot(wc, "_last_time")),
+                     ("client", _slot(wc, "type"), bssid,
+                      _macget(_slot(wc, "_client_mac")),
+                      _slot(wc, "_client_manuf")) +
+                     self._record_strings(wc))
+
+    def write(self, path):
+        """ Write the rows to a ColumnStore file. """
+        rows = len(self._times) // 2
+        width = len(_COLUMN_NUMBERS)
+        columns = [(name, self._numbers[i::width])
+                   for (i, name) in enumerate(_COLUMN_NUMBERS)]
+        columns += [(name, self._times[i::2])
+                    for (i, name) in enumerate(_COLUMN_TIMES)]
+        # String columns index one heap shared by all columns
+        strings = {}
+        width = len(_COLUMN_STRINGS)
+        for (i, name) in enumerate(_COLUMN_STRINGS):
+            ids = [strings.setdefault(value, len(strings))
+                   for value in sorted(self._categories[i],
+                                       key=self._categories[i].get)]
+            ids.append(-1)
+            columns.append((name, array.array(_STORE_STRING,
+                                              [ids[code] for code in
+                                               self._codes[i::width]])))
+        heap = [value.encode("utf-8") for value in
+                sorted(strings, key=strings.get)]
+        offsets = array.array("Q", [0])
+        for value in heap:
+            offsets.append(offsets[-1] + len(value))
+
+        # Header, column directory, then 8 byte aligned column data
+        position = _align(_STORE_HEADER.size +
+                          _STORE_COLUMN.size * len(columns))
+        directory = []
+        for (name, values) in columns:
+            directory.append(_STORE_COLUMN.pack(name.encode("ascii"),
+                                                values.typecode.encode("ascii"),
+                                                position))
+            position = _align(position + len(values) * values.itemsize)
+        offsets_position = position
+        heap_position = _align(position + len(offsets) * offsets.itemsize)
+        with open(path, "wb") as fh:
+            fh.write(_STORE_HEADER.pack(_STORE_MAGIC, _STORE_VERSION,
+                                        len(columns), rows, len(heap),
+                                        offsets_position, heap_position))
+            fh.write(b"".join(directory))
+            for values in [values for (name, values) in columns] + [offsets]:
+                fh.write(b"\0" * (_align(fh.tell()) - fh.tell()))
+                if sys.byteorder != "little":
+                    values = array.array(values.typecode, values)
+                    values.byteswap()
+                fh.write(values.tobytes())
+            fh.write(b"\0" * (_align(fh.tell()) - fh.tell()))
+            for value in heap:
+                fh.write(value)
+
+    def columns(self):
+        """ Return a dict of column name to NumPy array, or Categorical for
+            string columns. """
+        if np is None:
+            raise ImportError("NetXML columnar output requires numpy")
+        columns = {}
+        numbers = np.frombuffer(self._numbers, dtype=np.float64)
+        numbers = numbers.reshape(-1, len(_COLUMN_NUMBERS))
+        for (i, name) in enumerate(_COLUMN_NUMBERS):
+            columns[name] = np.ascontiguousarray(numbers[:, i])
+        times = np.frombuffer(self._times, dtype=np.int64).reshape(-1, 2)
+        for (i, name) in enumerate(_COLUMN_TIMES):
+            columns[name] = np.ascontiguousarray(times[:, i]).view("datetime64[s]")
+        codes = np.frombuffer(self._codes, dtype=np.dtype("l"))
+        codes = codes.reshape(-1, len(_COLUMN_STRINGS))
+        for (i, name) in enumerate(_COLUMN_STRINGS):
+            categories = sorted(self._categories[i], key=self._categories[i].get)
+            columns[name] = Categorical(codes[:, i].astype(np.int32),
+                                        categories)
+        return columns
+
+def _column_groups(column):
+    """ Return (groups, labels) numbering the distinct values of a column,
+        missing values form the last group, labelled None. """
+    if isinstance(column, Categorical):
+        labels = list(column.categories) + [None]
+        groups = np.where(column.codes < 0, len(labels) - 1, column.codes)
+        return (groups.astype(np.intp), labels)
+    missing = np.isnan(column)
+    (values, inverse) = np.unique(column[~missing], return_inverse=True)
+    groups = np.empty(len(column), dtype=np.intp)
+    groups[~missing] = inverse.ravel()
+    groups[missing] = len(values)
+    return (groups, values.tolist() + [None])
+
+def aggregate(columns, by, netxml_type="network"):
+    """ Aggregate the rows of NumPy columns (see iterparse columnar) grouped
+        by the values of a column, e.g., "channel", "manuf" or "privacy".
+        Only rows of netxml_type are used ("network", "client", or None for
+        all rows). Returns a dict of equal length columns: the group values
+        (keyed by the by column name), count, max_signal_dbm mean, min and
+        max, packets_total, packets_crypt and packets_retries sums, and the
+        retry_ratio (retries per total packet). """
+    if np is None:
+        raise ImportError("NetXML aggregates require numpy")
+    if by not in columns or by in _COLUMN_TIMES:
+        raise ValueError("Unknown NetXML aggregate column: %r" % by)
+    (groups, labels) = _column_groups(columns[by])
+    size = len(labels)
+    signal = columns["max_signal_dbm"]
+    sums = [np.nan_to_num(columns[name]) for name in
+            ("packets_total", "packets_crypt", "packets_retries")]
+    if netxml_type is not None:
+        types = columns["netxml_type"]
+        if netxml_type in types.categories:
+            rows = types.codes == types.categories.index(netxml_type)
+        else:
+            rows = np.zeros(len(types.codes), dtype=bool)
+        groups = groups[rows]
+        signal = signal[rows]
+        sums = [values[rows] for values in sums]
+
+    # Counts and sums are weighted bincounts over the group numbers
+    count = np.bincount(groups, minlength=size)
+    valid = ~np.isnan(signal)
+    signal_count = np.bincount(groups, weights=valid, minlength=size)
+    signal_sum = np.bincount(groups, weights=np.where(valid, signal, 0.0),
+                             minlength=size)
+    (total, crypt, retries) = [np.bincount(groups, weights=values,
+                                           minlength=size)
+                               for values in sums]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        signal_mean = signal_sum / signal_count
+        retry_ratio = np.where(total > 0, retries / total, np.nan)
+
+    # Extremes are reduced over contiguous runs of rows sorted by group
+    signal_min = np.full(size, np.nan)
+    signal_max = np.full(size, np.nan)
+    if len(groups):
+        order = np.argsort(groups, kind="stable")
+        ordered = groups[order]
+        starts = np.flatnonzero(np.concatenate(([True],
+                                                ordered[1:] != ordered[:-1])))
+        signal_min[ordered[starts]] = np.fmin.reduceat(signal[order], starts)
+        signal_max[ordered[starts]] = np.fmax.reduceat(signal[order], starts)
+
+    keep = count > 0
+    return {by: [label for (label, kept) in zip(labels, keep) if kept],
+            "count": count[keep],
+            "max_signal_dbm_mean": signal_mean[keep],
+            "max_signal_dbm_min": signal_min[keep],
+            "max_signal_dbm_max": signal_max[keep],
+            "packets_total": total[keep],
+            "packets_crypt": crypt[keep],
+            "packets_retries": retries[keep],
+            "retry_ratio": retry_ratio[keep]}
+
+################################################################################
+# ColumnStore file layout: header, column directory (name, typecode, offset),
+# columns of rows fixed-width little-endian values, string offsets (uint64,
+# one more than the number of strings) and the UTF-8 string heap. String
+# columns hold string numbers, -1 is missing.
+_STORE_MAGIC = b"NetXMLcs"
+_STORE_VERSION = 1
+_STORE_HEADER = struct.Struct("<8sIIQQQQ")
+_STORE_COLUMN = struct.Struct("<24scxxxxxxxQ")
+_STORE_STRING = "i"
+
+def _align(position):
+    """ Round a file position up to a multiple of 8. """
+    return (position + 7) & ~7
+
+class ColumnStore(object):
+    """ Read-only, memory-mapped columnar file of WirelessNetwork and
+        WirelessClient rows (see iterparse columnar for the columns). Opening
+        only reads the header, values are read from the mapped file when
+        accessed, so processes opening the same file share its pages. """
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise ValueError("Not a NetXML column store: %r" % path)
+        view = self._view = memoryview(self._mm)
+        (magic, version, count, rows, strings, offsets, heap) = \
+            _STORE_HEADER.unpack_from(view)
+        if magic != _STORE_MAGIC or version != _STORE_VERSION:
+            self.close()
+            raise ValueError("Not a NetXML column store: %r" % path)
+        self.rows = rows
+        self._columns = collections.OrderedDict()
+        self._offsets = {}
+        for i in range(count):
+            (name, typecode, position) = _STORE_COLUMN.unpack_from(
+                view, _STORE_HEADER.size + i * _STORE_COLUMN.size)
+            name = name.rstrip(b"\0").decode("ascii")
+            typecode = typecode.decode("ascii")
+            size = array.array(typecode).itemsize
+            self._columns[name] = view[position:position + rows * size].cast(typecode)
+            self._offsets[name] = position
+        self._string_offsets = view[offsets:offsets + (strings + 1) * 8].cast("Q")
+        self._heap = heap
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        return self.row(row)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self.row(row)
+
+    def close(self):
+        """ Release the column views and unmap the file. NumPy arrays from
+            array() that are still referenced keep the file mapped until
+            they are garbage collected. """
+        try:
+            for values in getattr(self, "_columns", {}).values():
+                values.release()
+            if hasattr(self, "_string_offsets"):
+                self._string_offsets.release()
+            self._view.release()
+            try:
+                self._mm.close()
+            except BufferError:
+                # Exported to NumPy arrays, the map is closed with them
+                pass
+        finally:
+            self._fh.close()
+
+    def names(self):
+        """ Return the column names. """
+        return list(self._columns)
+
+    def column(self, name):
+        """ Return a column as a memoryview of its values, without copying.
+            String columns hold string numbers, see string. """
+        return self._columns[name]
+
+    def string(self, number):
+        """ Return string number from the heap, None for -1. """
+        if number < 0:
+            return None
+        offsets = self._string_offsets
+        start = self._heap + offsets[number]
+        return self._mm[start:self._heap + offsets[number + 1]].decode("utf-8")
+
+    def row(self, row):
+        """ Return a row as a dict of column name to value, with None for
+            missing values and datetime objects for timestamps. """
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError("NetXML column store row out of range")
+        values = {}
+        for (name, column) in self._columns.items():
+            value = column[row]
+            if column.format == _STORE_STRING:
+                value = self.string(value)
+            elif name in _COLUMN_TIMES:
+                value = None if value == _NAT else _fromepoch(value)
+            elif value != value:
+                value = None
+            values[name] = value
+        return values
+
+    def array(self, name):
+        """ Return a column as a NumPy array sharing the mapped file. The
+            array stays valid after close, copy it to release the file. """
+        if np is None:
+            raise ImportError("NetXML column store arrays require numpy")
+        column = self._columns[name]
+        values = np.frombuffer(self._mm, dtype=np.dtype(column.format).newbyteorder("<"),
+                               count=self.rows, offset=self._offsets[name])
+        if name in _COLUMN_TIMES:
+            values = values.view("datetime64[s]")
+        return values
+
+def open_store(path):
+    """ Open a ColumnStore file written by write_store or NetXML.to_store. """
+    return ColumnStore(path)
+
+def write_store(filename, path, backend="auto", filters=None):
+    """ Parse a NetXML document straight into a ColumnStore file at path. """
+    builder = _ColumnBuilder(filters)
+    with _open_netxml(filename) as fh:
+        for (ln, elem) in _backend(backend)(fh):
+            if ln != "wireless-network":
+                continue
+            if filters is not None and not filters.match(elem):
+                continue
+            builder.add_element(elem)
+    builder.write(path)
+
+################################################################################
+def _confirm_netxml(filename):
+    """ Ask the user to confirm files without a .netxml extension, optionally
+        followed by a compression extension (e.g., .netxml.gz). """
+    (base, ext) = os.path.splitext(filename)
+    if ext in _COMPRESSED_EXTENSIONS:
+        filename = base
+    if not filename.endswith(".netxml"):
         check = input(">>> Is this a NetXML file? [Y] to continue...")
         if check == "Y" or check == "y" or check == "Yes" or check == "yes":
             pass
@@ -1282,26 +3245,811 @@ def iterparse(filename, events=("start","end"), **kwargs):
             print(">>> Quitting...")
             quit()
 
-    netxml = NetXML()
+def _open_netxml(filename):
+    """ Open a NetXML document for reading, confirming unknown extensions. """
+    _confirm_netxml(filename)
+    return _open_input(filename)
+
+# Compressed file signatures and extensions
+_COMPRESSION_MAGIC = ((b"\x1f\x8b", "gzip"),
+                      (b"BZh", "bz2"),
+                      (b"\xfd7zXZ\x00", "xz"),
+                      (b"\x28\xb5\x2f\xfd", "zstd"))
+_COMPRESSED_EXTENSIONS = set([".gz", ".bz2", ".xz", ".zst"])
+
+# Read buffer size of NetXML documents, and of each decompressed chunk
+_READ_BUFFER_SIZE = 1024 * 1024
+
+# Decompressed chunks buffered ahead of the parser by _ThreadedReader
+_DECOMPRESS_AHEAD = 4
+
+def _compression(filename):
+    """ Return the compression of a file ("gzip", "bz2", "xz" or "zstd")
+        detected from its magic bytes, or None. """
+    with open(filename, "rb") as fh:
+        magic = fh.read(6)
+    for (signature, codec) in _COMPRESSION_MAGIC:
+        if magic.startswith(signature):
+            return codec
+    return None
+
+class _ThreadedReader(io.RawIOBase):
+    """ Reads a stream on a background thread, so decompression (which
+        releases the GIL) overlaps with XML parsing. """
+    def __init__(self, stream, chunk_size=_READ_BUFFER_SIZE,
+                 ahead=_DECOMPRESS_AHEAD):
+        io.RawIOBase.__init__(self)
+        self._stream = stream
+        self._chunks = queue.Queue(ahead)
+        self._data = memoryview(b"")
+        self._done = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, args=(chunk_size,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, chunk_size):
+        try:
+            while not self._stopping:
+                data = self._stream.read(chunk_size)
+                self._chunks.put(data)
+                if not data:
+                    break
+        except BaseException as e:
+            self._chunks.put(e)
+
+    def readable(self):
+        return True
 
-    for (ETevent, elem) in ET.iterparse(fh, events=("start-ns", "start", "end")):
-        (ns, ln) = _qsplit(elem.tag)
+    def readinto(self, b):
+        while not len(self._data):
+            if self._done:
+                return 0
+            data = self._chunks.get()
+            if isinstance(data, BaseException):
+                self._done = True
+                raise data
+            if not data:
+                self._done = True
+                return 0
+            self._data = memoryview(data)
+        n = min(len(b), len(self._data))
+        b[:n] = self._data[:n]
+        self._data = self._data[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            # Unblock and stop the reading thread before closing its stream
+            self._stopping = True
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._stream.close()
+        io.RawIOBase.close(self)
+
+def _open_input(filename):
+    """ Open a NetXML document for reading with a large buffer. gzip, bz2,
+        xz and zstd compressed documents are detected by their magic bytes
+        and decompressed on a background thread while being parsed. """
+    codec = _compression(filename)
+    if codec is None:
+        return open(filename, "rb", buffering=_READ_BUFFER_SIZE)
+    if codec == "gzip":
+        stream = gzip.open(filename, "rb")
+    elif codec == "bz2":
+        stream = bz2.open(filename, "rb")
+    elif codec == "xz":
+        stream = lzma.open(filename, "rb")
+    elif zstandard is None:
+        raise ImportError("zstd compressed NetXML requires the zstandard package")
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(
+            open(filename, "rb"), read_size=_READ_BUFFER_SIZE, closefd=True)
+    return io.BufferedReader(_ThreadedReader(stream), _READ_BUFFER_SIZE)
+
+def _etree_elements(fh):
+    """ Generator. Yields (local tag name, element) pairs for card-source and
+        wireless-network elements using xml.etree.ElementTree. Each
+        wireless-network element is cleared and detached from the root once
+        the consumer resumes, so memory use stays flat. """
+    root = None
+    for (ETevent, elem) in ET.iterparse(fh, events=("start", "end")):
         if ETevent == "start":
-            pass
-        elif ETevent == "end":
+            if root is None:
+                root = elem
+            continue
+        ln = elem.tag
+        if ln[0] == "{":
+            (ns, ln) = _qsplit(ln)
+        if ln == "card-source":
+            yield (ln, elem)
+        elif ln == "wireless-network":
+            yield (ln, elem)
+            # Drop the parsed subtree, WirelessNetwork holds all the data
+            elem.clear()
+            if len(root) and root[-1] is elem:
+                del root[-1]
+
+def _lxml_elements(fh):
+    """ Generator. Same as _etree_elements, using lxml.etree. Only the wanted
+        end events are reported by lxml itself. Entities are not expanded and
+        nothing is fetched over the network, and libxml2's size and depth
+        limits stay in place, as captures may be untrusted. """
+    for (ETevent, elem) in LET.iterparse(fh,
+                                         events=("end",),
+                                         tag=("{*}card-source",
+                                              "{*}wireless-network"),
+                                         resolve_entities=False,
+                                         no_network=True,
+                                         remove_comments=True,
+                                         remove_pis=True):
+        (ns, ln) = _qsplit(elem.tag)
+        yield (ln, elem)
+        if ln == "wireless-network":
+            # Drop the parsed subtree and any earlier siblings
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+_BACKENDS = {"etree": _etree_elements,
+             "lxml": _lxml_elements}
+
+def _backend(name):
+    """ Return the element generator for a parser backend name. The "auto"
+        backend is lxml when it is installed, otherwise etree. """
+    if name == "auto":
+        name = "etree" if LET is None else "lxml"
+    if name not in _BACKENDS:
+        raise ValueError("Unknown NetXML parser backend: %r" % name)
+    if name == "lxml" and LET is None:
+        raise ImportError("The lxml backend requires the lxml package")
+    return _BACKENDS[name]
+
+def backends():
+    """ Return the names of the parser backends usable in this Python. """
+    return sorted(name for name in _BACKENDS if name != "lxml" or LET is not None)
+
+def _iterrecords(fh, decoder, backend="auto"):
+    """ Generator. Yields CardSource and WirelessNetwork objects as soon as
+        their end tags are parsed. """
+    for (ln, elem) in _backend(backend)(fh):
+        if ln == "card-source":
+            cs = CardSource(**elem.attrib)
+            cs.populate_from_Element(elem)
+            yield cs
+        else:
+            wn = decoder.network(elem)
+            if wn is not None:
+                yield wn
+
+class FeedParser(object):
+    """ Push parser for NetXML data arriving in pieces, e.g., from a pipe,
+        socket or decompression stream, using XMLPullParser. Each completed
+        WirelessNetwork is passed to callback, put on queue (a queue.Queue or
+        asyncio.Queue) and returned by the feed or close call that completed
+        it. The card-source is stored as card_source. Keyword arguments are
+        the same as for iterstream (except backend and workers). """
+    def __init__(self, callback=None, queue=None, **kwargs):
+        self.callback = callback
+        self.queue = queue
+        self.card_source = None
+        self._decoder = _decoder(**kwargs)
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+
+    def feed(self, data):
+        """ Parse the next piece of the document, a bytes object. Returns the
+            list of WirelessNetworks completed. """
+        self._parser.feed(data)
+        return self._deliver(self._records())
+
+    def close(self):
+        """ Finish the document, raising ParseError if it is incomplete.
+            Returns the list of WirelessNetworks completed. """
+        self._parser.close()
+        return self._deliver(self._records())
+
+    def _deliver(self, records):
+        networks = []
+        for record in records:
+            if isinstance(record, CardSource):
+                self.card_source = record
+                continue
+            networks.append(record)
+            if self.callback is not None:
+                self.callback(record)
+            if self.queue is not None:
+                self.queue.put_nowait(record)
+        return networks
+
+    def _records(self):
+        """ Return the CardSource and WirelessNetwork objects completed by
+            the data fed, wireless-network elements are then cleared and
+            detached the same way as by _etree_elements. """
+        records = []
+        for (ETevent, elem) in self._parser.read_events():
+            if ETevent == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            ln = elem.tag
+            if ln[0] == "{":
+                (ns, ln) = _qsplit(ln)
             if ln == "card-source":
                 cs = CardSource(**elem.attrib)
                 cs.populate_from_Element(elem)
-                netxml.card_source = cs
+                records.append(cs)
             elif ln == "wireless-network":
-                wn = WirelessNetwork(**elem.attrib)
-                wn.populate_from_Element(elem)
-                netxml.append(wn)
-            elif ln == "":
+                wn = self._decoder.network(elem)
+                if wn is not None:
+                    records.append(wn)
+                elem.clear()
+                root = self._root
+                if len(root) and root[-1] is elem:
+                    del root[-1]
+        return records
+
+# Files smaller than this are always parsed by a single process
+_PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+
+# Number of byte ranges given to each worker process, for load balancing
+_PARALLEL_RANGES_PER_WORKER = 4
+
+def _split_netxml(filename, parts):
+    """ Split a NetXML document into byte ranges that each hold whole
+        wireless-network elements. Returns (header_end, footer_start, ranges)
+        where the header is everything before the first wireless-network and
+        the footer starts at the closing detection-run tag, or None if the
+        document cannot be split. """
+    with open(filename, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = mm.find(b"<wireless-network")
+            end = mm.rfind(b"</detection-run")
+            if start < 0 or end < start:
+                return None
+            bounds = [start]
+            for part in range(1, parts):
+                pos = mm.find(b"<wireless-network",
+                              start + (end - start) * part // parts, end)
+                if pos < 0:
+                    break
+                if pos > bounds[-1]:
+                    bounds.append(pos)
+            bounds.append(end)
+        finally:
+            mm.close()
+    return (start, end, list(zip(bounds[:-1], bounds[1:])))
+
+def _read_range(filename, header_end, footer_start, start, end):
+    """ Return a standalone NetXML document for one byte range. """
+    with open(filename, "rb") as fh:
+        header = fh.read(header_end)
+        fh.seek(start)
+        body = fh.read(end - start)
+        fh.seek(footer_start)
+        footer = fh.read()
+    return header + body + footer
+
+# Parser state of a worker process, set by _init_worker
+_WORKER = {}
+
+def _init_worker(backend, options):
+    _WORKER["backend"] = backend
+    # Records are pickled back to the parent process, which decodes every
+    # lazily captured sub-object, so workers decode eagerly
+    _WORKER["decoder"] = _decoder(**dict(options, lazy=False))
+
+def _parse_range(task):
+    """ Worker process. Parse one byte range into a list of WirelessNetworks. """
+    document = _read_range(*task)
+    return [record for record in _iterrecords(io.BytesIO(document),
+                                              _WORKER["decoder"],
+                                              _WORKER["backend"])
+            if isinstance(record, WirelessNetwork)]
+
+def _iterparallel(filename, split, backend, workers, options):
+    """ Generator. Yields the records of a split NetXML document, parsed by a
+        pool of worker processes, in document order. """
+    (header_end, footer_start, ranges) = split
+    # The header holds the card-source, parse it with an empty body
+    header = _read_range(filename, header_end, footer_start, 0, 0)
+    for record in _iterrecords(io.BytesIO(header), _DECODER, backend):
+        yield record
+    tasks = [(filename, header_end, footer_start, start, end)
+             for (start, end) in ranges]
+    with multiprocessing.Pool(workers, _init_worker, (backend, options)) as pool:
+        for networks in pool.imap(_parse_range, tasks):
+            for wn in networks:
+                yield wn
+
+def _tag_source(wn, source):
+    """ Record the NetXML file a network and its clients were parsed from. """
+    wn.source = source
+    for wc in wn._WirelessClients:
+        wc.source = source
+
+def _iterfile(filename, backend="auto", workers=None, confirm=True,
+              **options):
+    """ Generator. Yields the CardSource and WirelessNetwork records of a
+        NetXML document, using worker processes if requested. filename may
+        also be a binary file object, which is parsed by this process. """
+    if hasattr(filename, "read"):
+        for record in _iterrecords(filename, _decoder(**options), backend):
+            yield record
+        return
+    if workers is not None:
+        if workers == 0:
+            workers = multiprocessing.cpu_count()
+        if (workers > 1 and os.path.getsize(filename) >= _PARALLEL_MIN_SIZE and
+                _compression(filename) is None):
+            if confirm:
+                _confirm_netxml(filename)
+            split = _split_netxml(filename,
+                                  workers * _PARALLEL_RANGES_PER_WORKER)
+            if split is not None:
+                for record in _iterparallel(filename, split, backend, workers,
+                                            options):
+                    if isinstance(record, WirelessNetwork):
+                        _tag_source(record, filename)
+                    yield record
+                return
+    decoder = _decoder(**options)
+    if confirm:
+        _confirm_netxml(filename)
+    with _open_input(filename) as fh:
+        for record in _iterrecords(fh, decoder, backend):
+            if isinstance(record, WirelessNetwork):
+                _tag_source(record, filename)
+            yield record
+
+def iterstream(filename, lazy_dates=False, lazy=False, fields=None,
+               filters=None, backend="auto", workers=None, compact=False):
+    """ Generator. Yields a stream of populated WirelessNetworks. With
+        lazy_dates, timestamps are kept as epoch integers until accessed. With
+        lazy, the ssid, _packets, _snr and _gps sub-objects are only decoded
+        when first accessed. With fields (e.g., {"bssid", "ssid.essid",
+        "gps.avg_lat", "client.client_mac"}), only the selected fields are
+        decoded and all others are None. With filters (a NetworkFilter), only
+        matching networks are decoded and yielded. The backend is the XML
+        parser to use: "etree", "lxml" or "auto" (lxml if installed). With
+        workers, large files are split and parsed by that many processes (0
+        for one per CPU), still yielding networks in document order; lazy has
+        no effect on files parsed by worker processes. With compact, bssid
+        and client_mac are stored as 48-bit integers (still returned as
+        colon-hex strings, see bssid_int and client_mac_int), and
+        manufacturer, ESSID and encryption strings are interned, so records
+        share one copy of each distinct value. filename may also be a binary
+        file object (e.g., sys.stdin.buffer), which is never confirmed
+        interactively. """
+    for record in _iterfile(filename, backend, workers, lazy_dates=lazy_dates,
+                            lazy=lazy, fields=fields, filters=filters,
+                            compact=compact):
+        if isinstance(record, WirelessNetwork):
+            yield record
+
+# Cache files start with the format version, which is also part of every key
+_CACHE_VERSION = 2
+_CACHE_MAGIC = b"NetXML cache %d\n" % _CACHE_VERSION
+_CACHE_SUFFIX = ".netxml-cache"
+
+# Bytes read from the start and end of a NetXML file for its cache key
+_CACHE_KEY_BLOCK = 64 * 1024
+
+# Cache directory size limit, least recently used files are removed first
+_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+
+def _cache_dir():
+    """ Directory of parsed NetXML files, $NETXML_CACHE_DIR or
+        ~/.cache/netxml. """
+    return os.environ.get("NETXML_CACHE_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache",
+                                       "netxml"))
+
+def _cache_key(filename):
+    """ Cache key of a NetXML file, from its real path, size, mtime and the
+        content of its first and last _CACHE_KEY_BLOCK bytes, so a cache hit
+        does not read the whole file. """
+    path = os.path.realpath(filename)
+    st = os.stat(path)
+    digest = hashlib.sha1(b"%d %d %d\n" % (_CACHE_VERSION, st.st_size,
+                                            st.st_mtime_ns))
+    digest.update(os.fsencode(path))
+    with open(path, "rb") as fh:
+        digest.update(fh.read(_CACHE_KEY_BLOCK))
+        if st.st_size > _CACHE_KEY_BLOCK:
+            fh.seek(max(_CACHE_KEY_BLOCK, st.st_size - _CACHE_KEY_BLOCK))
+            digest.update(fh.read(_CACHE_KEY_BLOCK))
+    return digest.hexdigest()
+
+def _cache_trusted(st):
+    """ True if a cache directory or file (os.stat result) is owned by the
+        current user and not writable by anyone else, as cache files are
+        unpickled and could otherwise run code planted by another user. """
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o022
+
+def _cache_load(path):
+    """ Return the NetXML object cached in path, or None. Files are only
+        loaded from trusted directories, see _cache_trusted. """
+    try:
+        if not _cache_trusted(os.stat(os.path.dirname(path))):
+            return None
+        with open(path, "rb") as fh:
+            if not _cache_trusted(os.fstat(fh.fileno())):
+                return None
+            if fh.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                return None
+            netxml = pickle.load(fh)
+        # Mark as recently used
+        os.utime(path)
+    except Exception:
+        # Missing, unreadable or corrupt cache files are parsed again
+        return None
+    return netxml if isinstance(netxml, NetXML) else None
+
+def _cache_store(path, netxml, cache_dir):
+    """ Write a parsed NetXML object to the cache, then evict the least
+        recently used files beyond _CACHE_MAX_SIZE. Failures are ignored. The
+        cache directory is created readable by the current user only. """
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        if not _cache_trusted(os.stat(cache_dir)):
+            return
+        (fd, tmp) = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(_CACHE_MAGIC)
+                pickle.dump(netxml, fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        _cache_evict(cache_dir, _CACHE_MAX_SIZE)
+    except (OSError, pickle.PicklingError):
+        pass
+
+def _cache_evict(cache_dir, max_size):
+    """ Remove the least recently used cache files until at most max_size
+        bytes remain. """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(_CACHE_SUFFIX):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    entries.sort(reverse=True)
+    total = 0
+    for (mtime, size, path) in entries:
+        total += size
+        if total > max_size:
+            try:
+                os.remove(path)
+            except OSError:
                 pass
 
+def clear_cache(cache_dir=None):
+    """ Remove all cached NetXML files. """
+    if cache_dir is None:
+        cache_dir = _cache_dir()
+    if os.path.isdir(cache_dir):
+        _cache_evict(cache_dir, 0)
+
+def iterparse(filename, events=("start","end"), backend="auto", workers=None,
+              columnar=False, cache=False, **kwargs):
+    """ Parse a NetXML document and return a populated NetXML object. Keyword
+        arguments are the same as for iterstream. With columnar, return a dict
+        of NumPy columns instead, decoded straight from the XML elements
+        (networks first, each followed by its clients). Only the filters
+        keyword argument applies to columnar parsing, which always uses a
+        single process. With cache True, full parses (no other keyword
+        arguments) are cached in _cache_dir, or in the directory cache names.
+        Cache directories must be owned by the current user, see
+        _cache_trusted. """
+    if columnar:
+        return _iterparse_columns(filename, backend, kwargs.get("filters"))
+    cached = (bool(cache) and isinstance(filename, str) and
+              not any(kwargs.values()))
+    if cached:
+        _confirm_netxml(filename)
+        cache_dir = cache if isinstance(cache, str) else _cache_dir()
+        try:
+            path = os.path.join(cache_dir, _cache_key(filename) + _CACHE_SUFFIX)
+        except OSError:
+            # Unreadable file, reported by the parse below
+            cached = False
+        else:
+            netxml = _cache_load(path)
+            if netxml is not None:
+                for wn in netxml._WirelessNetworks:
+                    _tag_source(wn, filename)
+                return netxml
+    netxml = NetXML()
+    for record in _iterfile(filename, backend, workers, not cached, **kwargs):
+        if isinstance(record, CardSource):
+            netxml.card_source = record
+        else:
+            netxml.append(record)
+    if cached:
+        _cache_store(path, netxml, cache_dir)
     return netxml
 
+def _iterparse_columns(filename, backend, filters):
+    """ Parse a NetXML document straight into NumPy columns. """
+    builder = _ColumnBuilder(filters)
+    with _open_netxml(filename) as fh:
+        for (ln, elem) in _backend(backend)(fh):
+            if ln != "wireless-network":
+                continue
+            if filters is not None and not filters.match(elem):
+                continue
+            builder.add_element(elem)
+    return builder.columns()
+
+def _expand_paths(paths):
+    """ Expand a path, glob pattern or collection of them into a list of
+        unique file names. """
+    if isinstance(paths, str):
+        paths = [paths]
+    expanded = []
+    seen = set()
+    for path in paths:
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path))
+        else:
+            matches = [path]
+        for match in matches:
+            if match not in seen:
+                seen.add(match)
+                expanded.append(match)
+    return expanded
+
+def _parse_file(path, decoder, backend):
+    """ Parse a whole NetXML file. Returns (path, networks, seconds). """
+    start = time.time()
+    networks = []
+    with _open_input(path) as fh:
+        for record in _iterrecords(fh, decoder, backend):
+            if isinstance(record, WirelessNetwork):
+                _tag_source(record, path)
+                networks.append(record)
+    return (path, networks, time.time() - start)
+
+def _parse_file_worker(path):
+    """ Worker process. Parse a whole NetXML file. """
+    return _parse_file(path, _WORKER["decoder"], _WORKER["backend"])
+
+def iterparse_many(paths, workers=None, report=None, backend="auto", **kwargs):
+    """ Generator. Yields the WirelessNetworks of many NetXML files, given as
+        file names and/or glob patterns (e.g., "Kismet-*.netxml"). With
+        workers, files are parsed concurrently by that many processes (0 for
+        one per CPU) and each file's networks are yielded as soon as it has
+        been parsed, fully decoded as with iterstream workers. Every network
+        and client has its source set to the file it came from. If given, report is called after each file as
+        report(path, networks, size, seconds). Other keyword arguments are
+        the same as for iterstream. """
+    paths = _expand_paths(paths)
+    if workers == 0:
+        workers = multiprocessing.cpu_count()
+    if workers is None or workers <= 1 or len(paths) <= 1:
+        decoder = _decoder(**kwargs)
+        results = (_parse_file(path, decoder, backend) for path in paths)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(workers, len(paths)), _init_worker,
+                                    (backend, kwargs))
+        results = pool.imap_unordered(_parse_file_worker, paths)
+    try:
+        for (path, networks, seconds) in results:
+            if report is not None:
+                report(path, len(networks), os.path.getsize(path), seconds)
+            for wn in networks:
+                yield wn
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+# Bytes read and parsed by aiterparse before yielding to the event loop
+_ASYNC_CHUNK_SIZE = 256 * 1024
+
+async def aiterparse(filename, chunk_size=_ASYNC_CHUNK_SIZE, **kwargs):
+    """ Asynchronous generator. Yields the populated WirelessNetworks of a
+        NetXML document without blocking the event loop: the file is read
+        in chunk_size pieces by the default executor, and each piece is fed
+        to an XMLPullParser before control returns to the event loop.
+        Keyword arguments are the same as for iterstream (except backend and
+        workers). Files are never confirmed interactively. """
+    loop = asyncio.get_running_loop()
+    parser = FeedParser(**kwargs)
+    with _open_input(filename) as fh:
+        while True:
+            data = await loop.run_in_executor(None, fh.read, chunk_size)
+            for wn in parser.feed(data) if data else parser.close():
+                _tag_source(wn, filename)
+                yield wn
+            if not data:
+                break
+            await asyncio.sleep(0)
+
+async def aparse(filename, chunk_size=_ASYNC_CHUNK_SIZE, **kwargs):
+    """ Coroutine. Parse a NetXML document like iterparse without blocking
+        the event loop, e.g., await asyncio.gather(aparse(a), aparse(b)) to
+        parse several files concurrently. Keyword arguments are the same as
+        for aiterparse. """
+    netxml = NetXML()
+    async for wn in aiterparse(filename, chunk_size, **kwargs):
+        netxml.append(wn)
+    return netxml
+
+# A change reported by follow: event is "new", "updated" or "removed" and
+# record the WirelessNetwork or WirelessClient concerned
+FollowEvent = collections.namedtuple("FollowEvent", "event record")
+
+# Bytes before the previous end of scan compared to detect rewrites
+_FOLLOW_TAIL = 64
+
+def _crc32(mm, start, end, crc=0):
+    """ CRC-32 of mm[start:end], continuing crc, without copying. """
+    with memoryview(mm) as view, view[start:end] as part:
+        return zlib.crc32(part, crc)
+
+class Follower(object):
+    """ Tracks a NetXML file that is still being written. Each poll scans the
+        wireless-network start tags for byte ranges whose start tag (number,
+        first-time and last-time) or length changed since the previous poll,
+        parses only those, and returns FollowEvents for new and updated
+        networks and clients. Growth of an unchanged file only scans the
+        appended bytes, the previously scanned bytes are confirmed unchanged
+        by their CRC-32. Any other change (e.g., Kismet rewriting the file)
+        scans the whole file and reports networks no longer present as
+        removed. Other keyword arguments are the same as for iterstream. """
+    def __init__(self, filename, backend="auto", **kwargs):
+        self.filename = filename
+        self.backend = backend
+        fields = kwargs.get("fields")
+        if fields is not None:
+            # Networks and clients are tracked by bssid/client_mac and last_time
+            fields = [fields] if isinstance(fields, str) else list(fields)
+            fields += ["bssid", "last_time"]
+            if any(field.startswith("client") for field in fields):
+                fields += ["client.client_mac", "client.last_time"]
+            kwargs["fields"] = fields
+        self._decoder = _decoder(**kwargs)
+        # Latest record of each bssid, and last_time of each client
+        self.networks = {}
+        self._clients = {}
+        # Start tag and length of each network range to its bssid
+        self._known = {}
+        self._signature = None
+        self._inode = None
+        self._end = 0
+        self._tail = b""
+        # CRC-32 of the bytes before _end
+        self._crc = 0
+
+    def poll(self):
+        """ Return the FollowEvents since the previous poll. """
+        try:
+            fh = open(self.filename, "rb")
+        except (IOError, OSError):
+            # Missing while being replaced
+            return []
+        with fh:
+            st = os.fstat(fh.fileno())
+            signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if signature == self._signature or st.st_size == 0:
+                return []
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                (events, complete) = self._scan(mm, st.st_ino)
+            finally:
+                mm.close()
+        if complete:
+            self._signature = signature
+        return events
+
+    def _scan(self, mm, inode):
+        # The tail is a quick check, a same length rewrite of earlier bytes
+        # is only found by the CRC
+        append = (inode == self._inode and self._end and
+                  len(mm) >= self._end and
+                  mm[self._end - len(self._tail):self._end] == self._tail and
+                  _crc32(mm, 0, self._end) == self._crc)
+        start = self._end if append else 0
+        known = self._known if append else {}
+
+        # Byte ranges of the complete wireless-network elements
+        changed = []
+        end = start
+        pos = mm.find(b"<wireless-network", start)
+        while pos >= 0:
+            tag_end = mm.find(b">", pos)
+            close = mm.find(b"</wireless-network>", pos)
+            if tag_end < 0 or close < 0:
+                break
+            end = close + len(b"</wireless-network>")
+            key = (mm[pos:tag_end + 1], end - pos)
+            if key in self._known:
+                known[key] = self._known[key]
+            else:
+                changed.append((key, pos, end))
+            pos = mm.find(b"<wireless-network", end)
+        complete = pos < 0 and mm.find(b"</detection-run", end) >= 0
+
+        events = []
+        if changed:
+            root = mm.find(b"<detection-run")
+            document = (mm[:root] if root > 0 else b"") + b"<detection-run>"
+            document += b"".join(mm[s:e] for (key, s, e) in changed)
+            document += b"</detection-run>"
+            elements = (elem for (ln, elem) in
+                        _backend(self.backend)(io.BytesIO(document))
+                        if ln == "wireless-network")
+            for ((key, s, e), elem) in zip(changed, elements):
+                wn = self._decoder.network(elem)
+                known[key] = self._update(wn, events) if wn is not None else None
+
+        if not append:
+            if complete:
+                present = set(known.values())
+                for bssid in [b for b in self.networks if b not in present]:
+                    events.append(FollowEvent("removed", self.networks.pop(bssid)))
+                for client in [c for c in self._clients if c[0] not in present]:
+                    del self._clients[client]
+            else:
+                # Partly written, keep the ranges beyond the written part
+                for (key, bssid) in self._known.items():
+                    known.setdefault(key, bssid)
+        self._known = known
+        self._inode = inode
+        if append:
+            self._crc = _crc32(mm, self._end, end, self._crc)
+        else:
+            self._crc = _crc32(mm, 0, end)
+        self._end = end
+        self._tail = mm[max(0, end - _FOLLOW_TAIL):end]
+        return (events, complete)
+
+    def _update(self, wn, events):
+        """ Record a parsed network, adding its events. Returns its bssid. """
+        bssid = _slot(wn, "_bssid")
+        events.append(FollowEvent("updated" if bssid in self.networks else "new",
+                                  wn))
+        self.networks[bssid] = wn
+        for wc in wn._WirelessClients or ():
+            client = (bssid, _slot(wc, "_client_mac"))
+            last_time = _slot(wc, "_last_time")
+            if client not in self._clients:
+                events.append(FollowEvent("new", wc))
+            elif self._clients[client] != last_time:
+                events.append(FollowEvent("updated", wc))
+            self._clients[client] = last_time
+        return bssid
+
+def follow(filename, interval=5.0, backend="auto", **kwargs):
+    """ Generator. Follows a NetXML file that is still being written, e.g.,
+        by a running Kismet survey, yielding FollowEvents for new, updated
+        and removed networks and clients. The file is polled every interval
+        seconds, see Follower. Other keyword arguments are the same as for
+        iterstream. """
+    follower = Follower(filename, backend, **kwargs)
+    while True:
+        for event in follower.poll():
+            yield event
+        time.sleep(interval)
+
 ################################################################################
 if __name__=="__main__":
     import argparse
@@ -1314,11 +4062,36 @@ safety, serializability, and de-serializability. You can process a NetXML
 document using the iterparse function.''')
     parser.add_argument("netxml_file",
                         help = "Target NetXML file (e.g. Kismet-20150505-05-15-05-1.netxml)")
+    parser.add_argument("--summary",
+                        action = "append",
+                        choices = ["channel", "manuf", "privacy"],
+                        help = "Print network statistics grouped by channel, manuf or privacy (requires numpy)")
     args = parser.parse_args()
     print(">>> Input NetXML file: %s" % os.path.basename(args.netxml_file))
 
-    # A simple example of parsing a NetXML file and printing network details
-    netxml = iterparse(args.netxml_file)
-    for w in netxml:
-        if isinstance(w, WirelessNetwork) and w.ssid:
-            print(w.number, w.bssid, w.ssid.essid, w.ssid.privacy)
+    if args.summary:
+        # Aggregate network signal and packet statistics
+        columns = iterparse(args.netxml_file, columnar=True)
+        for by in args.summary:
+            summary = aggregate(columns, by)
+            print("  > {0:<16s}\t{1:>6s}\t{2:>8s}\t{3:>8s}\t{4:>8s}\t{5:>10s}\t{6:>10s}\t{7:>10s}\t{8:>6s}".format(
+                by, "Count", "Mean dBm", "Min dBm", "Max dBm", "Packets", "Crypt",
+                "Retries", "Retry%"))
+            for i in range(len(summary[by])):
+                print("  > {0:<16s}\t{1:6d}\t{2:8.1f}\t{3:8.1f}\t{4:8.1f}\t{5:10.0f}\t{6:10.0f}\t{7:10.0f}\t{8:6.1f}".format(
+                    "%g" % summary[by][i] if isinstance(summary[by][i], float) else str(summary[by][i]),
+                    summary["count"][i],
+                    summary["max_signal_dbm_mean"][i],
+                    summary["max_signal_dbm_min"][i],
+                    summary["max_signal_dbm_max"][i],
+                    summary["packets_total"][i],
+                    summary["packets_crypt"][i],
+                    summary["packets_retries"][i],
+                    summary["retry_ratio"][i] * 100.0))
+    else:
+        # A simple example of parsing a NetXML file and printing network details
+        netxml = iterparse(args.netxml_file,
+                           fields=["number", "bssid", "ssid.essid", "ssid.privacy"])
+        for w in netxml:
+            if isinstance(w, WirelessNetwork) and w.ssid:
+                print(w.number, w.bssid, w.ssid.essid, w.ssid.privacy)
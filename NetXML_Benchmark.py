@@ -0,0 +1,165 @@
+# !/usr/bin/python
+
+"""
+Author:  Thomas Laurenson
+Email:   thomas@thomaslaurenson.com
+Website: thomaslaurenson.com
+Date:    2016/08/07
+
+Description:
+Measure parsing time and memory usage of the NetXML.py API on a NetXML file.
+
+Copyright (c) 2016, Thomas Laurenson
+
+###############################################################################
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###############################################################################
+
+>>> CHANGELOG:
+    0.1.0       Base functionality
+"""
+
+__version__ = "0.1.0"
+
+import os
+import gc
+import bz2
+import gzip
+import lzma
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+import NetXML
+import NetXML_Export
+
+################################################################################
+def bench_parse(netxml_file, label="iterparse", **kwargs):
+    """ Time a full NetXML.iterparse of the file. """
+    start = time.time()
+    netxml = NetXML.iterparse(netxml_file, **kwargs)
+    elapsed = time.time() - start
+    records = sum(1 for record in netxml)
+    size = os.path.getsize(netxml_file) / (1024.0 * 1024.0)
+    print("  > {0:<24s}\t{1:8.3f} s\t{2:8.2f} MB/s\t{3:d} records".format(
+        label, elapsed, size / elapsed, records))
+
+def record_state(obj):
+    """ Return the comparable state of a NetXML record and its sub-objects. """
+    if isinstance(obj, list):
+        return [record_state(value) for value in obj]
+    if not hasattr(obj, "__slots__"):
+        return obj
+    return [(slot, record_state(getattr(obj, slot)))
+            for slot in obj.__slots__ if slot != "_pending"]
+
+def bench_backends(netxml_file):
+    """ Time each available parser backend and check they produce identical
+        WirelessNetwork/WirelessClient records. """
+    reference = None
+    for backend in NetXML.backends():
+        start = time.time()
+        netxml = NetXML.iterparse(netxml_file, backend=backend, cache=False)
+        elapsed = time.time() - start
+        state = [record_state(record) for record in netxml]
+        if reference is None:
+            reference = state
+        result = "identical" if state == reference else "DIFFERENT"
+        print("  > {0:<24s}\t{1:8.3f} s\t{2:s}".format(
+            "backend " + backend, elapsed, result))
+    if "lxml" not in NetXML.backends():
+        print("  > {0:<24s}\tnot installed".format("backend lxml"))
+
+def bench_cache(netxml_file):
+    """ Time a parse that writes the cache, then a load from the cache. """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        bench_parse(netxml_file, "iterparse cache write", cache=cache_dir)
+        bench_parse(netxml_file, "iterparse cache read", cache=cache_dir)
+    finally:
+        shutil.rmtree(cache_dir)
+
+def bench_compressed(netxml_file):
+    """ Time parsing gzip, bz2, xz (and zstd, if installed) compressed copies
+        of the file. Throughput is of the uncompressed size. """
+    codecs = [("gzip", ".gz", gzip.compress),
+              ("bz2", ".bz2", bz2.compress),
+              ("xz", ".xz", lzma.compress)]
+    if NetXML.zstandard is not None:
+        codecs.append(("zstd", ".zst",
+                       NetXML.zstandard.ZstdCompressor().compress))
+    with open(netxml_file, "rb") as f:
+        data = f.read()
+    size = len(data) / (1024.0 * 1024.0)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for (codec, ext, compress) in codecs:
+            path = os.path.join(tmp_dir, os.path.basename(netxml_file) + ext)
+            with open(path, "wb") as f:
+                f.write(compress(data))
+            start = time.time()
+            netxml = NetXML.iterparse(path, cache=False)
+            elapsed = time.time() - start
+            records = sum(1 for record in netxml)
+            print("  > {0:<24s}\t{1:8.3f} s\t{2:8.2f} MB/s\t{3:5.1f}% size\t{4:d} records".format(
+                "compressed " + codec, elapsed, size / elapsed,
+                100.0 * os.path.getsize(path) / len(data), records))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def bench_csv(netxml_file):
+    """ Time streaming the file, and streaming it to CSV using write_csv. """
+    start = time.time()
+    records = sum(1 for wn in NetXML.iterstream(netxml_file))
+    elapsed = time.time() - start
+    size = os.path.getsize(netxml_file) / (1024.0 * 1024.0)
+    print("  > {0:<24s}\t{1:8.3f} s\t{2:8.2f} MB/s\t{3:d} networks".format(
+        "iterstream", elapsed, size / elapsed, records))
+    start = time.time()
+    rows = NetXML_Export.write_csv(NetXML.iterstream(netxml_file), os.devnull)
+    elapsed = time.time() - start
+    print("  > {0:<24s}\t{1:8.3f} s\t{2:8.2f} MB/s\t{3:d} rows".format(
+        "write_csv", elapsed, size / elapsed, rows))
+
+def bench_memory(netxml_file, label="memory", **kwargs):
+    """ Measure memory retained per WirelessNetwork/WirelessClient record. """
+    gc.collect()
+    tracemalloc.start()
+    netxml = NetXML.iterparse(netxml_file, cache=False, **kwargs)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    records = sum(1 for record in netxml)
+    print("  > {0:<24s}\t{1:8.1f} bytes/record\t{2:d} records".format(
+        label, retained / float(records), records))
+
+################################################################################
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='''NetXML_Benchmark.py''')
+    parser.add_argument("netxml_file",
+                        help = "Target NetXML file (e.g. Kismet-20150506-08-23-31-1.netxml)")
+    args = parser.parse_args()
+    print(">>> %s" % os.path.basename(args.netxml_file))
+
+    bench_parse(args.netxml_file)
+    bench_parse(args.netxml_file, "iterparse lazy_dates", lazy_dates=True)
+    bench_parse(args.netxml_file, "iterparse lazy", lazy=True)
+    bench_backends(args.netxml_file)
+    bench_cache(args.netxml_file)
+    bench_compressed(args.netxml_file)
+    bench_csv(args.netxml_file)
+    bench_memory(args.netxml_file)
+    bench_memory(args.netxml_file, "memory compact", compact=True)
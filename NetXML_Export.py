@@ -0,0 +1,510 @@
+# !/usr/bin/python
+
+"""
+Author:  Thomas Laurenson
+Email:   thomas@thomaslaurenson.com
+Website: thomaslaurenson.com
+Date:    2016/08/07
+
+Description:
+Streaming CSV and KML/KMZ writers for records parsed by the NetXML.py API.
+
+Copyright (c) 2016, Thomas Laurenson
+
+###############################################################################
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###############################################################################
+
+>>> CHANGELOG:
+    0.1.0       Base functionality
+"""
+
+__version__ = "0.1.0"
+
+import io
+import os
+import bz2
+import csv
+import gzip
+import lzma
+import shutil
+import asyncio
+import zipfile
+import operator
+import tempfile
+import itertools
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from NetXML import (NetXML, WirelessNetwork, SSIDObject, PacketsObject,
+                    GPSInfoObject, _blank, _dateget, _macget)
+
+################################################################################
+# Header of the CSV files written by write_csv
+CSV_COLUMNS = ("type",
+               "network_number",
+               "client_number",
+               "network_type",
+               "mac_address",
+               "essid",
+               "manuf",
+               "channel",
+               "freqmhz",
+               "max_rate",
+               "beacon_rate",
+               "cloaked",
+               "encryption",
+               "privacy",
+               "cipher",
+               "authentication",
+               "wpa_version",
+               "wps",
+               "ssid_frame_type",
+               "carrier",
+               "encoding",
+               "first_time",
+               "last_time",
+               "max_seen_rate",
+               "packets_beacons",
+               "packets_llc",
+               "packets_data",
+               "packets_crypt",
+               "packets_fragments",
+               "packets_retries",
+               "packets_total",
+               "data_size",
+               "min_lat",
+               "min_lon",
+               "min_alt",
+               "min_spd",
+               "max_lat",
+               "max_lon",
+               "max_alt",
+               "max_spd",
+               "peak_lat",
+               "peak_lon",
+               "peak_alt",
+               "avg_lat",
+               "avg_lon",
+               "avg_alt")
+
+# Rows are buffered and passed to csv.writer.writerows in batches of this size
+_CSV_BATCH_SIZE = 1024
+
+# Write buffer size of CSV and KML output files
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Stand-ins for missing sub-objects, so rows are built without None checks
+_NO_SSID = _blank(SSIDObject)
+_NO_PACKETS = _blank(PacketsObject)
+_NO_GPS = _blank(GPSInfoObject)
+
+# Precompiled extraction of the packet and GPS columns of a row
+_CSV_PACKETS = operator.attrgetter("_llc", "_data", "_crypt", "_fragments",
+                                   "_retries", "_total")
+_CSV_GPS = operator.attrgetter("_min_lat", "_min_lon", "_min_alt", "_min_spd",
+                               "_max_lat", "_max_lon", "_max_alt", "_max_spd",
+                               "_peak_lat", "_peak_lon", "_peak_alt",
+                               "_avg_lat", "_avg_lon", "_avg_alt")
+
+def _csv_network_row(wn):
+    """ Return the CSV row of a WirelessNetwork, read directly from its slots.
+        Missing SSID, packets and gps-info elements give empty columns. """
+    ssid = wn._ssid or _NO_SSID
+    return (("network",
+             wn._number,
+             "",
+             wn._network_type,
+             _macget(wn._bssid),
+             ssid._essid,
+             wn._manuf,
+             wn._channel,
+             ";".join(wn._freqmhz or ()),
+             ssid._max_rate,
+             ssid._beaconrate,
+             ssid._cloaked,
+             ";".join(ssid._encryption or ()),
+             ssid._privacy,
+             ssid._cipher,
+             ssid._authentication,
+             ssid.wpa_version,
+             ssid.wps,
+             ssid._frame_type,
+             "",
+             "",
+             _dateget(wn._first_time),
+             _dateget(wn._last_time),
+             wn._maxseenrate,
+             ssid._packets) +
+            _CSV_PACKETS(wn._packets or _NO_PACKETS) +
+            (wn._datasize,) +
+            _CSV_GPS(wn._gps or _NO_GPS))
+
+def _csv_client_row(wc):
+    """ Return the CSV row of a WirelessClient, read directly from its slots. """
+    return (("client",
+             wc.network_number,
+             wc._number,
+             wc.type,
+             _macget(wc._client_mac),
+             "",
+             wc._client_manuf,
+             wc._channel,
+             ";".join(wc._freqmhz or ()),
+             "",
+             "",
+             "",
+             "",
+             "",
+             "",
+             "",
+             "",
+             "",
+             "",
+             wc._carrier,
+             wc._encoding,
+             _dateget(wc._first_time),
+             _dateget(wc._last_time),
+             wc._maxseenrate,
+             "") +
+            _CSV_PACKETS(wc._packets or _NO_PACKETS) +
+            (wc._datasize,) +
+            _CSV_GPS(wc._gps or _NO_GPS))
+
+def _csv_records(records):
+    """ Return the networks and top level clients of a NetXML object, as its
+        own iteration also yields the clients of each network. """
+    if isinstance(records, NetXML):
+        return itertools.chain(records._WirelessNetworks,
+                               records._WirelessClients)
+    return records
+
+def csv_rows(records):
+    """ Generator. Yields a CSV row (see CSV_COLUMNS) for each record of a
+        NetXML object, or of an iterable of WirelessNetworks (e.g., iterstream)
+        and WirelessClients. Each network is followed by its clients, and
+        clients with the MAC address of the preceding network are skipped. """
+    network_mac = None
+    for record in _csv_records(records):
+        if record.__class__ is WirelessNetwork:
+            network_mac = record._bssid
+            yield _csv_network_row(record)
+            for wc in record._WirelessClients:
+                if wc._client_mac != network_mac:
+                    yield _csv_client_row(wc)
+        elif record._client_mac != network_mac:
+            yield _csv_client_row(record)
+
+def _open_output(path):
+    """ Open an output file for writing with a large buffer, compressed with
+        gzip, bz2, xz or zstd when path ends with .gz, .bz2, .xz or .zst.
+        Returns the files to write to and close, outermost first. """
+    ext = os.path.splitext(path)[1]
+    fh = open(path, "wb", buffering=_WRITE_BUFFER_SIZE)
+    if ext == ".gz":
+        return [gzip.GzipFile(fileobj=fh, mode="wb", filename=""), fh]
+    if ext == ".bz2":
+        return [bz2.BZ2File(fh, "wb"), fh]
+    if ext == ".xz":
+        return [lzma.LZMAFile(fh, "wb"), fh]
+    if ext == ".zst":
+        if zstandard is None:
+            fh.close()
+            raise ImportError("zstd compressed output requires the zstandard package")
+        return [zstandard.ZstdCompressor().stream_writer(fh), fh]
+    return [fh]
+
+class _TextSink(object):
+    """ A text stream for output written to a path (compressed according to
+        its extension), a binary file object or a text file object. Files
+        opened from a path are closed by close, file objects are flushed. """
+    def __init__(self, out):
+        self._files = []
+        if isinstance(out, str):
+            self._files = _open_output(out)
+            out = self._files[0]
+        self._wrapped = not isinstance(out, io.TextIOBase)
+        if self._wrapped:
+            self.stream = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        else:
+            self.stream = out
+
+    def close(self):
+        self.stream.flush()
+        if self._wrapped:
+            self.stream.detach()
+        for fh in self._files:
+            fh.close()
+
+def _csv_writer(sink, delimiter, header):
+    """ Return a csv.writer on sink, having written the header if required. """
+    writer = csv.writer(sink.stream, delimiter=delimiter)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    return writer
+
+def write_csv(records, out, delimiter="\t", header=True):
+    """ Write the records of a NetXML object, or an iterable of WirelessNetworks
+        and WirelessClients, as CSV (tab separated by default) to out, see
+        csv_rows. out is a path, compressed when it ends with .gz, .bz2, .xz
+        or .zst, or a binary or text file object. Records are consumed as they
+        arrive, so iterstream output is written in constant memory. Returns
+        the number of rows written, excluding the header. """
+    sink = _TextSink(out)
+    try:
+        writerows = _csv_writer(sink, delimiter, header).writerows
+        rows = csv_rows(records)
+        count = 0
+        while True:
+            batch = list(itertools.islice(rows, _CSV_BATCH_SIZE))
+            if not batch:
+                break
+            writerows(batch)
+            count += len(batch)
+    finally:
+        sink.close()
+    return count
+
+async def awrite_csv(records, out, delimiter="\t", header=True):
+    """ Coroutine. Write records like write_csv, where records may also be an
+        asynchronous iterable (e.g., aiterparse). Each batch of rows is written
+        by the default executor, so the event loop is not blocked. """
+    if not hasattr(records, "__aiter__"):
+        records = _aiter(_csv_records(records))
+    loop = asyncio.get_running_loop()
+    sink = _TextSink(out)
+    try:
+        writerows = _csv_writer(sink, delimiter, header).writerows
+        count = 0
+        batch = []
+        network_mac = None
+        async for record in records:
+            if record.__class__ is WirelessNetwork:
+                network_mac = record._bssid
+                batch.extend(csv_rows((record,)))
+            elif record._client_mac != network_mac:
+                batch.append(_csv_client_row(record))
+            if len(batch) >= _CSV_BATCH_SIZE:
+                await loop.run_in_executor(None, writerows, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await loop.run_in_executor(None, writerows, batch)
+            count += len(batch)
+    finally:
+        await loop.run_in_executor(None, sink.close)
+    return count
+
+async def _aiter(records):
+    """ Asynchronous generator over a synchronous iterable. """
+    for record in records:
+        yield record
+
+################################################################################
+_KML_HEADER = ("<?xml version='1.0' encoding='UTF-8'?>\n"
+               "<kml xmlns='http://www.opengis.net/kml/2.2'>\n"
+               "  <Document>\n" +
+               "".join("    <Style id='%s'>\n"
+                       "      <IconStyle>\n"
+                       "        <Icon>\n"
+                       "          <href>http://maps.google.com/mapfiles/kml/pushpin/%s-pushpin.png</href>\n"
+                       "        </Icon>\n"
+                       "      </IconStyle>\n"
+                       "    </Style>\n" % pin
+                       for pin in (("greenpin", "grn"), ("yellowpin", "ylw"),
+                                   ("redpin", "red"), ("whitepin", "wht"))) +
+               "    <name>%s</name>\n"
+               "    <description><![CDATA[]]></description>\n")
+
+_KML_FOOTER = ("  </Document>\n"
+               "</kml>\n")
+
+_KML_FOLDER = ("    <Folder>\n"
+               "    <name>%s: %d networks</name>\n")
+
+_KML_FOLDER_END = "    </Folder>\n"
+
+# Placemark of a network, filled with essid, essid, bssid, manuf, network_type,
+# channel, encryption, last_time, lat, lon, style, lon and lat
+_KML_PLACEMARK = ("      <Placemark>\n"
+                  "        <name>%s</name>\n"
+                  "        <description><![CDATA[SSID: %s<br> MAC: %s<br> Manuf: %s<br> Type: %s<br> Channel: %s<br> Encryption: %s<br> Last time: %s<br> GPS: %s,%s]]></description>\n"
+                  "        <styleUrl>%s</styleUrl>\n"
+                  "        <Point>\n"
+                  "          <coordinates>%s,%s,0.0</coordinates>\n"
+                  "        </Point>\n"
+                  "      </Placemark>\n")
+
+# Map pin of each folder: GREEN = WPA2, YELLOW = WPA, RED = WEP, WHITE = OPEN
+_KML_STYLES = {"WPA2": "#greenpin", "WPA": "#yellowpin", "WEP": "#redpin"}
+
+_KML_WPA_FOLDERS = {"WPA+WPA2": "WPA2", "WPA2": "WPA2", "WPA": "WPA"}
+
+# Placemarks are joined and written to the spill files in batches of this size
+_KML_BATCH_SIZE = 1024
+
+def _kml_folder(ssid):
+    """ Return the encryption folder of a network's SSID, or None if its
+        encryption is unknown. """
+    folder = _KML_WPA_FOLDERS.get(ssid.wpa_version)
+    if folder is None:
+        return ssid._privacy
+    return folder
+
+def _kml_escape(value):
+    """ Escape text for a KML element, leaving empty values unchanged. """
+    if value:
+        return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return value
+
+class KMLWriter(object):
+    """ Writes WirelessNetworks to a KML document with one folder of map pins
+        per encryption type (WPA2, WPA, WEP, OPEN, ...). Placemarks are
+        spilled to a temporary file per folder as networks are added, and the
+        document is assembled when the writer is closed, so memory use does
+        not grow with the number of networks. out is a path, zipped as KMZ
+        when it ends with .kmz, or a binary file object. """
+    def __init__(self, out, name=None):
+        self._out = out
+        if name is None:
+            name = out if isinstance(out, str) else ""
+        self.name = name
+        # Folder name: [spill file, pending placemarks, number of placemarks]
+        self._folders = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def add(self, wn):
+        """ Add the placemark of a WirelessNetwork. Returns its folder name,
+            or None if the network was skipped as its encryption is unknown. """
+        ssid = wn._ssid or _NO_SSID
+        folder = _kml_folder(ssid)
+        if folder is None:
+            return None
+        gps = wn._gps
+        if gps:
+            (lat, lon) = (gps._avg_lat, gps._avg_lon)
+        else:
+            (lat, lon) = (0.0, 0.0)
+        essid = _kml_escape(ssid._essid)
+        placemark = _KML_PLACEMARK % (essid, essid, _macget(wn._bssid), wn._manuf,
+                                      wn._network_type, wn._channel,
+                                      ";".join(ssid._encryption or ()),
+                                      _dateget(wn._last_time), lat, lon,
+                                      _KML_STYLES.get(folder, "#whitepin"),
+                                      lon, lat)
+        entry = self._folders.get(folder)
+        if entry is None:
+            entry = [tempfile.TemporaryFile(buffering=_WRITE_BUFFER_SIZE), [], 0]
+            self._folders[folder] = entry
+        pending = entry[1]
+        pending.append(placemark)
+        entry[2] += 1
+        if len(pending) >= _KML_BATCH_SIZE:
+            entry[0].write("".join(pending).encode("utf-8"))
+            del pending[:]
+        return folder
+
+    def extend(self, networks):
+        """ Add the placemarks of several WirelessNetworks, see add. """
+        for wn in networks:
+            self.add(wn)
+
+    def counts(self):
+        """ Return a dict of the number of networks in each folder, in the
+            order the folders were created. """
+        return dict((folder, entry[2]) for (folder, entry) in self._folders.items())
+
+    def close(self):
+        """ Write the KML document and remove the spill files. """
+        zf = None
+        if not isinstance(self._out, str):
+            files = [self._out]
+        elif os.path.splitext(self._out)[1].lower() == ".kmz":
+            zf = zipfile.ZipFile(self._out, "w", zipfile.ZIP_DEFLATED)
+            files = [zf.open("doc.kml", "w")]
+        else:
+            files = _open_output(self._out)
+        try:
+            out = files[0]
+            out.write((_KML_HEADER % _kml_escape(self.name)).encode("utf-8"))
+            for (folder, (spill, pending, count)) in self._folders.items():
+                out.write((_KML_FOLDER % (folder, count)).encode("utf-8"))
+                spill.seek(0)
+                shutil.copyfileobj(spill, out, _WRITE_BUFFER_SIZE)
+                out.write(("".join(pending) + _KML_FOLDER_END).encode("utf-8"))
+            out.write(_KML_FOOTER.encode("utf-8"))
+            out.flush()
+        finally:
+            if isinstance(self._out, str):
+                for fh in files:
+                    fh.close()
+            if zf is not None:
+                zf.close()
+            self._discard()
+
+    def _discard(self):
+        """ Close and remove the spill files. """
+        for entry in self._folders.values():
+            entry[0].close()
+
+def write_kml(records, out, name=None):
+    """ Write the WirelessNetworks of a NetXML object, or of an iterable of
+        records (e.g., iterstream, so the networks are never all held in
+        memory), to a KML or KMZ document, see KMLWriter. Returns the number
+        of networks in each encryption folder. """
+    if isinstance(records, NetXML):
+        records = records._WirelessNetworks
+    with KMLWriter(out, name) as writer:
+        for record in records:
+            if record.__class__ is WirelessNetwork:
+                writer.add(record)
+    return writer.counts()
+
+async def awrite_kml(records, out, name=None):
+    """ Coroutine. Write records like write_kml, where records may also be an
+        asynchronous iterable (e.g., aiterparse). Networks are added to the
+        spill files in batches, and the document is assembled, by the default
+        executor, so file I/O never blocks the event loop. """
+    if isinstance(records, NetXML):
+        records = records._WirelessNetworks
+    if not hasattr(records, "__aiter__"):
+        records = _aiter(records)
+    loop = asyncio.get_running_loop()
+    writer = KMLWriter(out, name)
+    try:
+        batch = []
+        async for record in records:
+            if record.__class__ is WirelessNetwork:
+                batch.append(record)
+                if len(batch) >= _KML_BATCH_SIZE:
+                    await loop.run_in_executor(None, writer.extend, batch)
+                    batch = []
+        if batch:
+            await loop.run_in_executor(None, writer.extend, batch)
+    except BaseException:
+        writer._discard()
+        raise
+    await loop.run_in_executor(None, writer.close)
+    return writer.counts()
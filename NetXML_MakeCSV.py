@@ -32,170 +32,49 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 __version__ = "0.1.0"
 
+import os
 import sys
-import csv
 import NetXML
+import NetXML_Export
+
+################################################################################
+def report(path, networks, size, seconds):
+    """ Print per file parsing throughput to stderr. """
+    sys.stderr.write(">>> {0:s}\t{1:d} networks\t{2:.2f} MB/s\n".format(
+        os.path.basename(path), networks, size / (1024.0 * 1024.0) / seconds))
 
 ################################################################################
 if __name__=="__main__":
     import argparse
     parser = argparse.ArgumentParser(description='''NetXML_MakeCSV.py''')
-    parser.add_argument("netxml_file",
-                        help = "Target NetXML file (e.g. Kismet-20150506-08-23-31-1.netxml)")
+    parser.add_argument("netxml_files",
+                        nargs = "+",
+                        help = "Target NetXML file(s) or glob pattern (e.g. Kismet-20150506-08-23-31-1.netxml)")
+    parser.add_argument("--workers",
+                        type = int,
+                        help = "Number of processes used to parse multiple NetXML files (0 for one per CPU)")
+    parser.add_argument("--known_macs",
+                        action = 'store',
+                        help = "Text file of known MACs/BSSIDs (or OUI wildcards, e.g. 00:11:22:*) to ignore")
     args = parser.parse_args()
 
-    # Parse NetXML file using NetXML.iterparse
-    netxml = NetXML.iterparse(args.netxml_file)
-
-    # Set up the CSV writer
-    output = csv.writer(sys.stdout, delimiter='\t')
-    
-    # Write CSV headers
-    output.writerow(("type",
-                     "network_number",
-                     "client_number",
-                     "network_type",
-                     "mac_address",
-                     "essid",
-                     "manuf",
-                     "channel",
-                     "freqmhz",
-                     "max_rate",
-                     "beacon_rate",
-                     "cloaked",
-                     "encryption",
-                     "privacy",
-                     "cipher",
-                     "authentication",
-                     "wpa_version",
-                     "wps",
-                     "ssid_frame_type",
-                     "carrier",
-                     "encoding",
-                     "first_time",
-                     "last_time",
-                     "max_seen_rate",
-                     "packets_beacons",
-                     "packets_llc",
-                     "packets_data",
-                     "packets_crypt",
-                     "packets_fragments",
-                     "packets_retries",
-                     "packets_total",
-                     "data_size",
-                     "min_lat",
-                     "min_lon",
-                     "min_alt",
-                     "min_spd",
-                     "max_lat",
-                     "max_lon",
-                     "max_alt",
-                     "max_spd",
-                     "peak_lat",
-                     "peak_lon",
-                     "peak_alt",
-                     "avg_lat",
-                     "avg_lon",
-                     "avg_alt"))     
-    
-    # Print WirelessNetworks in CSV format to std.out
-    current_network_mac = None
-    for wn in netxml:
-        if isinstance(wn, NetXML.WirelessNetwork):
-            current_network_mac = wn.bssid
-            output.writerow((wn.netxml_type,
-                             wn.number,
-                             "",
-                             wn.network_type,
-                             wn.bssid,
-                             wn.ssid.essid,
-                             wn.manuf,
-                             wn.channel,
-                             ";".join(wn.freqmhz),
-                             wn.ssid.max_rate,
-                             wn.ssid.beaconrate,
-                             wn.ssid.cloaked,
-                             ";".join(wn.ssid.encryption),
-                             wn.ssid.privacy,
-                             wn.ssid.cipher,
-                             wn.ssid.authentication,
-                             wn.ssid.wpa_version,
-                             wn.ssid.wps,
-                             wn.ssid.frame_type,
-                             "",
-                             "",                             
-                             wn.first_time, 
-                             wn.last_time,
-                             wn.maxseenrate,
-                             wn.ssid.packets,
-                             wn._packets.llc,
-                             wn._packets.data,
-                             wn._packets.crypt,
-                             wn._packets.fragments,
-                             wn._packets.retries,
-                             wn._packets.total,
-                             wn.datasize,
-                             wn._gps.min_lat,
-                             wn._gps.min_lon,
-                             wn._gps.min_alt,
-                             wn._gps.min_spd,
-                             wn._gps.max_lat,
-                             wn._gps.max_lon,
-                             wn._gps.max_alt,
-                             wn._gps.max_spd,
-                             wn._gps.peak_lat,
-                             wn._gps.peak_lon,
-                             wn._gps.peak_alt,
-                             wn._gps.avg_lat,
-                             wn._gps.avg_lon,
-                             wn._gps.avg_alt))
-        if isinstance(wn, NetXML.WirelessClient):
-            if current_network_mac == wn.client_mac:
-                continue
-            output.writerow((wn.netxml_type,
-                             wn.network_number,
-                             wn.number,
-                             wn.type,
-                             wn.client_mac,
-                             "",
-                             wn.client_manuf,
-                             wn.channel,
-                             ";".join(wn.freqmhz),
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             "",
-                             wn.carrier,
-                             wn.encoding,                            
-                             wn.first_time, 
-                             wn.last_time,
-                             wn.maxseenrate,
-                             "",
-                             wn._packets.llc,
-                             wn._packets.data,
-                             wn._packets.crypt,
-                             wn._packets.fragments,
-                             wn._packets.retries,
-                             wn._packets.total,
-                             wn.datasize,
-                             wn._gps.min_lat,
-                             wn._gps.min_lon,
-                             wn._gps.min_alt,
-                             wn._gps.min_spd,
-                             wn._gps.max_lat,
-                             wn._gps.max_lon,
-                             wn._gps.max_alt,
-                             wn._gps.max_spd,
-                             wn._gps.peak_lat,
-                             wn._gps.peak_lon,
-                             wn._gps.peak_alt,
-                             wn._gps.avg_lat,
-                             wn._gps.avg_lon,
-                             wn._gps.avg_alt))
+    # If requested remove specific MACs/BSSIDs from output CSV file, known
+    # networks and clients are skipped while parsing
+    filters = None
+    if args.known_macs:
+        known_macs = NetXML.MACFilter.from_file(args.known_macs)
+        filters = NetXML.NetworkFilter(exclude_bssids = known_macs,
+                                       exclude_client_macs = known_macs)
 
+    # Stream a single NetXML file using NetXML.iterstream, or many NetXML
+    # files using NetXML.iterparse_many, and print WirelessNetworks and
+    # WirelessClients in CSV format to std.out
+    if len(args.netxml_files) == 1 and os.path.isfile(args.netxml_files[0]):
+        networks = NetXML.iterstream(args.netxml_files[0],
+                                     filters = filters)
+    else:
+        networks = NetXML.iterparse_many(args.netxml_files,
+                                         workers = args.workers,
+                                         report = report,
+                                         filters = filters)
+    NetXML_Export.write_csv(networks, sys.stdout)
@@ -33,155 +33,74 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 __version__ = "0.1.0"
 
 import os
-import sys
-import math
-import collections
-from xml.sax.saxutils import escape
 
 import NetXML
+import NetXML_Export
 
 ################################################################################
 if __name__=="__main__":
     import argparse
     parser = argparse.ArgumentParser(description='''NetXML_MakeKML.py''')
-    parser.add_argument("netxml_file",
-                        help = "Target NetXML file (e.g. Kismet-20150506-08-23-31-1.netxml)")
+    parser.add_argument("netxml_files",
+                        nargs = "+",
+                        help = "Target NetXML file(s) or glob pattern (e.g. Kismet-20150506-08-23-31-1.netxml)")
+    parser.add_argument("--workers",
+                        type = int,
+                        help = "Number of processes used to parse multiple NetXML files (0 for one per CPU)")
+    parser.add_argument("--output",
+                        action = 'store',
+                        help = "Output KML file name (default: first NetXML file name with .kml extension)")
     parser.add_argument("--known_macs",
                         action = 'store',
-                        help = "Text file of known MACs/BSSIDs to ignore")
+                        help = "Text file of known MACs/BSSIDs (or OUI wildcards, e.g. 00:11:22:*) to ignore")
     args = parser.parse_args()
 
     # Fetch input NetXML file name
-    fn = os.path.splitext(os.path.basename(args.netxml_file))[0] 
+    fn = os.path.splitext(os.path.basename(args.netxml_files[0]))[0] 
     print(">>> %s" % fn)
     
-    # If requested remove specific MACs/BSSIDs from output KML file
-    known_macs = list()
+    # If requested remove specific MACs/BSSIDs (or OUI wildcards, e.g.,
+    # 00:11:22:*) from output KML file, the known MACs/BSSIDs are skipped
+    # while parsing
+    filters = None
     if args.known_macs:
-        with open(args.known-macs) as f:
-            for l in f:
-                l = l.strip()
-                known_macs.append(l)
+        known_macs = NetXML.MACFilter.from_file(args.known_macs)
+        filters = NetXML.NetworkFilter(exclude_bssids=known_macs)
 
-    # Parse NetXML file using NetXML.iterparse function
-    netxml = NetXML.iterparse(args.netxml_file)
-    
-    # Classify WirelessNetworks based on encryption
-    networks = collections.defaultdict(list)
-    for wn in netxml:
-        if isinstance(wn, NetXML.WirelessNetwork):
-            if wn.ssid.wpa_version == "WPA+WPA2":
-                 networks["WPA2"].append(wn)
-            elif wn.ssid.wpa_version == "WPA2":
-                 networks["WPA2"].append(wn)
-            elif wn.ssid.wpa_version == "WPA":
-                 networks["WPA"].append(wn)
-            elif wn.ssid.privacy == None:
-                 # Skip networks without knwon encryption
-                 continue
-            else:
-                networks[wn.ssid.privacy].append(wn)
+    # Stream NetXML file using NetXML.iterstream function, or many NetXML files
+    # using NetXML.iterparse_many, only decoding the fields used in the KML
+    # output
+    fields = ["bssid",
+              "manuf",
+              "network_type",
+              "channel",
+              "last_time",
+              "ssid.essid",
+              "ssid.encryption",
+              "ssid.privacy",
+              "ssid.wpa_version",
+              "gps.avg_lat",
+              "gps.avg_lon"]
+    if len(args.netxml_files) == 1 and os.path.isfile(args.netxml_files[0]):
+        networks = NetXML.iterstream(args.netxml_files[0],
+                                     fields = fields,
+                                     filters = filters)
+    else:
+        def report(path, count, size, seconds):
+            print("  > {0:<12s}\t{1:<6d}\t{2:.2f} MB/s".format(
+                os.path.basename(path), count, size / (1024.0 * 1024.0) / seconds))
+        networks = NetXML.iterparse_many(args.netxml_files,
+                                         workers = args.workers,
+                                         report = report,
+                                         fields = fields,
+                                         filters = filters)
     
+    # Stream WirelessNetworks into a KML file (or KMZ file, if the output
+    # file name ends with .kmz) with a folder for each encryption type
+    out_fn = args.output if args.output else fn + ".kml"
+    counts = NetXML_Export.write_kml(networks, out_fn)
+
     # Print overview of networks to stdout
     print("  > {0:<12s}\t{1:<6s}".format("Encryption", "Count"))
-    for k,v in networks.items():
-        print("  > {0:<12s}\t{1:<6d}".format(k, len(networks[k])))
-    
-    # Setup an output KML file for each encryption type
-    out_fn = fn + ".kml"
-    f = open(out_fn, 'w')    
-    
-    # Print KML header, with dynamic file name
-    f.write("<?xml version='1.0' encoding='UTF-8'?>\n")
-    f.write("<kml xmlns='http://www.opengis.net/kml/2.2'>\n")
-    f.write("  <Document>\n")
-    
-    # Define styles for KML document
-    f.write("    <Style id='greenpin'>\n")
-    f.write("      <IconStyle>\n")
-    f.write("        <Icon>\n")
-    f.write("          <href>http://maps.google.com/mapfiles/kml/pushpin/grn-pushpin.png</href>\n")
-    f.write("        </Icon>\n")
-    f.write("      </IconStyle>\n")
-    f.write("    </Style>\n")
-    f.write("    <Style id='yellowpin'>\n")
-    f.write("      <IconStyle>\n")
-    f.write("        <Icon>\n")
-    f.write("          <href>http://maps.google.com/mapfiles/kml/pushpin/ylw-pushpin.png</href>\n")
-    f.write("        </Icon>\n")
-    f.write("      </IconStyle>\n")
-    f.write("    </Style>\n")
-    f.write("    <Style id='redpin'>\n")
-    f.write("      <IconStyle>\n")
-    f.write("        <Icon>\n")
-    f.write("          <href>http://maps.google.com/mapfiles/kml/pushpin/red-pushpin.png</href>\n")
-    f.write("        </Icon>\n")
-    f.write("      </IconStyle>\n")
-    f.write("    </Style>\n")
-    f.write("    <Style id='whitepin'>\n")
-    f.write("      <IconStyle>\n")
-    f.write("        <Icon>\n")
-    f.write("          <href>http://maps.google.com/mapfiles/kml/pushpin/wht-pushpin.png</href>\n")
-    f.write("        </Icon>\n")
-    f.write("      </IconStyle>\n")
-    f.write("    </Style>\n")  
-    
-    f.write("    <name>%s</name>\n" % out_fn)
-    f.write("    <description><![CDATA[]]></description>\n")        
-      
-    # Print WirelessNetworks in KML format to stdout
-    for encryption in networks:
-
-        # Start KML folder structure for each encryption type
-        f.write("    <Folder>\n") 
-        f.write("    <name>%s: %d networks</name>\n" % (encryption, 
-                                                        len(networks[encryption])))
-
-        # Loop through networks based on encryption type
-        for network in networks[encryption]:
-            
-            # Filter knwon MACs/BSSID if requested
-            if args.known_macs:
-                if network.bssid in known_macs:
-                    continue
-            
-            # First, determine encryption type, and map icon to use
-            # GREEN = WPA2, YELLOW = WPA, RED = WEP, WHITE = OPEN
-            if encryption == "WPA2":
-                style = "#greenpin"
-            elif encryption == "WPA":
-                style = "#yellowpin"
-            elif encryption == "WEP":
-                style = "#redpin"    
-            else:
-                style = "#whitepin"     
-                
-            if network.ssid.essid:
-                essid = escape(network.ssid.essid)
-            else:
-                essid = network.ssid.essid
-                
-            if network._gps:
-                lat = network._gps.avg_lat
-                lon = network._gps.avg_lon
-            else:
-                lat = 0.0
-                lon = 0.0     
-            
-            # Create and print a placemark element for each network
-            f.write("      <Placemark>\n")
-            f.write("        <name>%s</name>\n" % essid)
-            f.write("        <description><![CDATA[SSID: %s<br> MAC: %s<br> Manuf: %s<br> Type: %s<br> Channel: %s<br> Encryption: %s<br> Last time: %s<br> GPS: %s,%s]]></description>\n" % (essid, network.bssid, network.manuf, network.network_type, network.channel, ";".join(network.ssid.encryption), str(network.last_time), lat, lon))
-            f.write("        <styleUrl>%s</styleUrl>\n" % style)
-            f.write("        <Point>\n")
-            f.write("          <coordinates>%s,%s,0.0</coordinates>\n" % (lon, lat))
-            f.write("        </Point>\n")
-            f.write("      </Placemark>\n")
-            
-        # Close KML Folder element
-        f.write("    </Folder>\n")
-      
-    # Finally, close document and kml elements
-    f.write("  </Document>\n")        
-    f.write("</kml>\n")
-    f.close()
+    for k,v in counts.items():
+        print("  > {0:<12s}\t{1:<6d}".format(k, v))
@@ -0,0 +1,100 @@
+"""
+Tests for the NetXML_Export.py writers, run with: python -m pytest tests
+"""
+
+import io
+import os
+import sys
+import csv
+import gzip
+import asyncio
+import zipfile
+import unittest
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NetXML
+import NetXML_Export
+from test_netxml import SampleTestCase
+
+################################################################################
+class TestCSV(SampleTestCase):
+    def read_rows(self, data):
+        return list(csv.reader(io.StringIO(data.decode("utf-8"), newline=""),
+                               delimiter="\t"))
+
+    def test_rows(self):
+        out = io.BytesIO()
+        count = NetXML_Export.write_csv(NetXML.iterstream(self.path), out)
+        rows = self.read_rows(out.getvalue())
+        self.assertEqual(count, 4)
+        self.assertEqual(tuple(rows[0]), NetXML_Export.CSV_COLUMNS)
+        self.assertEqual([row[0] for row in rows[1:]],
+                         ["network", "client", "client", "network"])
+        self.assertTrue(all(len(row) == 46 for row in rows))
+        # Missing gps-info gives empty columns
+        self.assertEqual(rows[3][-14:], [""] * 14)
+        self.assertEqual(rows[4][4], "00:11:22:33:44:55")
+
+    def test_compressed_and_compact(self):
+        path = os.path.join(self.tmp_dir, "sample.csv.gz")
+        NetXML_Export.write_csv(NetXML.iterparse(self.path), path)
+        out = io.BytesIO()
+        NetXML_Export.write_csv(NetXML.iterstream(self.path, compact=True), out)
+        with gzip.open(path) as f:
+            self.assertEqual(f.read(), out.getvalue())
+
+    def test_async(self):
+        out = io.BytesIO()
+        NetXML_Export.write_csv(NetXML.iterstream(self.path), out)
+        aout = io.BytesIO()
+        asyncio.run(NetXML_Export.awrite_csv(NetXML.aiterparse(self.path), aout))
+        self.assertEqual(aout.getvalue(), out.getvalue())
+
+class TestKML(SampleTestCase):
+    def test_folders(self):
+        out = io.BytesIO()
+        counts = NetXML_Export.write_kml(NetXML.iterstream(self.path), out,
+                                         name="sample")
+        self.assertEqual(counts, {"WPA2": 1, "WEP": 1})
+        kml = out.getvalue().decode("utf-8")
+        self.assertIn("<name>WPA2: 1 networks</name>", kml)
+        self.assertIn("<name>HomeNet &amp; Co</name>", kml)
+        self.assertIn("<coordinates>170.504,-45.866,0.0</coordinates>", kml)
+
+    def test_kmz(self):
+        out = io.BytesIO()
+        NetXML_Export.write_kml(NetXML.iterstream(self.path), out, name="x")
+        path = os.path.join(self.tmp_dir, "sample.kmz")
+        NetXML_Export.write_kml(NetXML.iterstream(self.path), path, name="x")
+        with zipfile.ZipFile(path) as zf:
+            self.assertEqual(zf.read("doc.kml"), out.getvalue())
+
+    def test_async(self):
+        out = io.BytesIO()
+        NetXML_Export.write_kml(NetXML.iterstream(self.path), out, name="x")
+        aout = io.BytesIO()
+        counts = asyncio.run(NetXML_Export.awrite_kml(
+            NetXML.aiterparse(self.path), aout, name="x"))
+        self.assertEqual(counts, {"WPA2": 1, "WEP": 1})
+        self.assertEqual(aout.getvalue(), out.getvalue())
+
+    def test_async_io_off_event_loop(self):
+        threads = []
+        add = NetXML_Export.KMLWriter.add
+        def record_thread(writer, wn):
+            threads.append(threading.current_thread())
+            return add(writer, wn)
+        NetXML_Export.KMLWriter.add = record_thread
+        try:
+            asyncio.run(NetXML_Export.awrite_kml(
+                NetXML.aiterparse(self.path), io.BytesIO()))
+        finally:
+            NetXML_Export.KMLWriter.add = add
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1031 @@
+"""
+Tests for the NetXML.py API, run with: python -m pytest tests
+"""
+
+import io
+import bz2
+import gzip
+import lzma
+import queue
+import os
+import re
+import sys
+import random
+import shutil
+import tempfile
+import datetime
+import unittest
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NetXML
+
+################################################################################
+SAMPLE_NETXML = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<!DOCTYPE detection-run SYSTEM "http://kismetwireless.net/kismet-3.1.0.dtd">
+<detection-run kismet-version="2013.03.R0" start-time="Wed May  6 08:23:31 2015">
+<card-source uuid="a4ff-1"><card-source>wlan0</card-source><card-name>wlan0</card-name><card-interface>wlan0</card-interface><card-type>mac80211</card-type><card-packets>1234</card-packets><card-hop>true</card-hop><card-channels>1,6,11</card-channels></card-source>
+<wireless-network number="1" type="infrastructure" first-time="Fri Feb  5 08:07:31 2015" last-time="Thu Aug 25 20:24:50 2015">
+<SSID first-time="Fri Feb  5 08:07:31 2015" last-time="Thu Aug 25 20:24:50 2015">
+<type>Beacon</type>
+<max-rate>54.000000</max-rate><packets>914</packets><beaconrate>10</beaconrate>
+<encryption>WPA+PSK</encryption>
+<encryption>WPA+AES-CCM</encryption>
+<wpa-version>WPA2</wpa-version>
+<essid cloaked="false">HomeNet &amp; Co</essid>
+</SSID>
+<BSSID>E4:88:75:34:A2:0F</BSSID><manuf>Cisco</manuf><channel>6</channel>
+<freqmhz>2437 20</freqmhz><freqmhz>2442 3</freqmhz>
+<maxseenrate>54000</maxseenrate><carrier>IEEE 802.11g</carrier><encoding>OFDM</encoding>
+<packets><LLC>351</LLC><data>110</data><crypt>496</crypt><total>957</total><fragments>0</fragments><retries>37</retries></packets>
+<datasize>30451</datasize>
+<snr-info>
+<last_signal_dbm>-48</last_signal_dbm><last_noise_dbm>-95</last_noise_dbm>
+<min_signal_dbm>-70</min_signal_dbm><min_noise_dbm>-96</min_noise_dbm>
+<max_signal_dbm>-40</max_signal_dbm><max_noise_dbm>-90</max_noise_dbm>
+</snr-info>
+<gps-info>
+<min-lat>-45.870000</min-lat><min-lon>170.500000</min-lon><min-alt>10.0</min-alt><min-spd>0.0</min-spd>
+<max-lat>-45.860000</max-lat><max-lon>170.510000</max-lon><max-alt>20.0</max-alt><max-spd>5.0</max-spd>
+<peak-lat>-45.865000</peak-lat><peak-lon>170.505000</peak-lon><peak-alt>15.0</peak-alt>
+<avg-lat>-45.866000</avg-lat><avg-lon>170.504000</avg-lon><avg-alt>14.0</avg-alt>
+</gps-info>
+<bsstimestamp>446869806</bsstimestamp><cdp-device></cdp-device><cdp-portid></cdp-portid>
+<wireless-client number="1" type="established" first-time="Fri Feb  5 08:07:31 2015" last-time="Thu Aug 25 20:24:50 2015">
+<client-mac>33:5F:97:3D:AA:D8</client-mac><client-manuf>Apple</client-manuf><channel>6</channel>
+<freqmhz>2437 8</freqmhz><maxseenrate>1000</maxseenrate><carrier>IEEE 802.11b+</carrier><encoding>CCK</encoding>
+<packets><LLC>43</LLC><data>48</data><crypt>25</crypt><total>116</total><fragments>0</fragments><retries>3</retries></packets>
+<datasize>565</datasize>
+<snr-info>
+<last_signal_dbm>-34</last_signal_dbm><min_signal_dbm>-42</min_signal_dbm><max_signal_dbm>-25</max_signal_dbm>
+</snr-info>
+<gps-info>
+<min-lat>-45.861000</min-lat><min-lon>171.008000</min-lon><min-alt>7.0</min-alt><min-spd>0.0</min-spd>
+<max-lat>-45.861000</max-lat><max-lon>171.008000</max-lon><max-alt>9.0</max-alt><max-spd>1.0</max-spd>
+<peak-lat>-45.861000</peak-lat><peak-lon>171.008000</peak-lon><peak-alt>8.0</peak-alt>
+<avg-lat>-45.861000</avg-lat><avg-lon>171.008000</avg-lon><avg-alt>8.0</avg-alt>
+</gps-info>
+<cdp-device></cdp-device><cdp-portid></cdp-portid>
+</wireless-client>
+<wireless-client number="2" type="fromds" first-time="Sat Feb  6 10:00:00 2015" last-time="Sat Feb  6 11:00:00 2015">
+<client-mac>C9:57:56:74:06:66</client-mac><client-manuf>Unknown</client-manuf><channel>6</channel>
+<freqmhz>2437 6</freqmhz><maxseenrate>1000</maxseenrate><carrier>IEEE 802.11b+</carrier><encoding>CCK</encoding>
+<packets><LLC>4</LLC><data>3</data><crypt>2</crypt><total>9</total><fragments>0</fragments><retries>0</retries></packets>
+<datasize>441</datasize>
+<cdp-device></cdp-device><cdp-portid></cdp-portid>
+</wireless-client>
+</wireless-network>
+<wireless-network number="2" type="infrastructure" first-time="Mon Mar  2 09:15:00 2015" last-time="Mon Mar  2 09:45:12 2015">
+<SSID first-time="Mon Mar  2 09:15:00 2015" last-time="Mon Mar  2 09:45:12 2015">
+<type>Beacon</type>
+<max-rate>11.000000</max-rate><packets>20</packets><beaconrate>10</beaconrate>
+<encryption>WEP</encryption>
+<essid cloaked="false">OldRouter</essid>
+</SSID>
+<BSSID>00:11:22:33:44:55</BSSID><manuf>Netgear</manuf><channel>11</channel>
+<freqmhz>2462 20</freqmhz>
+<maxseenrate>11000</maxseenrate><carrier>IEEE 802.11b</carrier><encoding>CCK</encoding>
+<packets><LLC>20</LLC><data>0</data><crypt>0</crypt><total>20</total><fragments>0</fragments><retries>0</retries></packets>
+<datasize>0</datasize>
+<bsstimestamp>1234</bsstimestamp><cdp-device></cdp-device><cdp-portid></cdp-portid>
+</wireless-network>
+</detection-run>
+"""
+
+AGGREGATE_NETXML = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<detection-run kismet-version="2013.03.R0" start-time="Wed May  6 08:23:31 2015">
+<wireless-network number="1" type="infrastructure" first-time="Fri Feb  5 08:07:31 2015" last-time="Fri Feb  5 09:07:31 2015">
+<SSID><encryption>WEP</encryption><essid cloaked="false">one</essid></SSID>
+<BSSID>02:00:00:00:00:01</BSSID><channel>1</channel>
+<packets><crypt>80</crypt><total>100</total><retries>10</retries></packets>
+<snr-info><max_signal_dbm>-40</max_signal_dbm></snr-info>
+<wireless-client number="1" type="established" first-time="Fri Feb  5 08:07:31 2015" last-time="Fri Feb  5 09:07:31 2015">
+<client-mac>02:00:00:00:01:01</client-mac><channel>1</channel>
+<packets><total>1000</total><retries>1000</retries></packets>
+<snr-info><max_signal_dbm>-10</max_signal_dbm></snr-info>
+</wireless-client>
+</wireless-network>
+<wireless-network number="2" type="infrastructure" first-time="Fri Feb  5 08:07:31 2015" last-time="Fri Feb  5 09:07:31 2015">
+<SSID><encryption>WEP</encryption><essid cloaked="false">two</essid></SSID>
+<BSSID>02:00:00:00:00:02</BSSID><channel>1</channel>
+<packets><crypt>0</crypt><total>50</total><retries>0</retries></packets>
+<snr-info><max_signal_dbm>-60</max_signal_dbm></snr-info>
+</wireless-network>
+<wireless-network number="3" type="probe" first-time="Fri Feb  5 08:07:31 2015" last-time="Fri Feb  5 09:07:31 2015">
+<BSSID>02:00:00:00:00:03</BSSID>
+</wireless-network>
+</detection-run>
+"""
+
+def record_state(obj):
+    """ Return the comparable state of a NetXML record, slot by slot, with
+        its sub-objects and clients. Lazily captured sub-objects are decoded. """
+    if isinstance(obj, list):
+        return [record_state(value) for value in obj]
+    if not hasattr(obj, "__slots__"):
+        return obj
+    return [(slot, record_state(getattr(obj, slot, None)))
+            for slot in obj.__slots__ if slot not in ("_pending", "source")]
+
+def many_networks(count):
+    """ Return SAMPLE_NETXML with its networks repeated count times, each with
+        a distinct number and BSSID. """
+    blocks = re.findall(r"<wireless-network .*?</wireless-network>\n",
+                        SAMPLE_NETXML, re.S)
+    head = SAMPLE_NETXML[:SAMPLE_NETXML.index(blocks[0])]
+    networks = [re.sub(r"<BSSID>.*?</BSSID>",
+                       "<BSSID>02:00:00:00:%02X:%02X</BSSID>" % (n // 256, n % 256),
+                       blocks[n % len(blocks)].replace(
+                           'number="%d"' % (n % len(blocks) + 1),
+                           'number="%d"' % (n + 1), 1))
+                for n in range(count)]
+    return head + "".join(networks) + "</detection-run>\n"
+
+################################################################################
+class SampleTestCase(unittest.TestCase):
+    """ Writes SAMPLE_NETXML to a temporary .netxml file. """
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp_dir, "sample.netxml")
+        with open(cls.path, "w") as f:
+            f.write(SAMPLE_NETXML)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+class TestNetworkFilter(SampleTestCase):
+    def test_since_until_must_be_datetime(self):
+        with self.assertRaises(TypeError):
+            NetXML.NetworkFilter(since="2015-01-01")
+        with self.assertRaises(TypeError):
+            NetXML.NetworkFilter(until=1420070400)
+
+    def test_bbox_must_have_four_values(self):
+        with self.assertRaises(ValueError):
+            NetXML.NetworkFilter(bbox=(-46.0, 170.0, -45.0))
+
+    def test_since(self):
+        since = datetime.datetime(2015, 8, 1)
+        networks = list(NetXML.iterstream(
+            self.path, filters=NetXML.NetworkFilter(since=since)))
+        self.assertEqual([wn.bssid for wn in networks], ["E4:88:75:34:A2:0F"])
+
+class TestBackends(SampleTestCase):
+    def parse(self, backend, **kwargs):
+        netxml = NetXML.iterparse(self.path, backend=backend, cache=False,
+                                  **kwargs)
+        return [record_state(wn) for wn in netxml._WirelessNetworks]
+
+    def test_sample_records(self):
+        networks = self.parse("etree")
+        self.assertEqual(len(networks), 2)
+        netxml = NetXML.iterparse(self.path, backend="etree", cache=False)
+        wn = netxml._WirelessNetworks[0]
+        self.assertEqual(len(wn._WirelessClients), 2)
+        self.assertEqual(wn.ssid.essid, "HomeNet & Co")
+        self.assertEqual(wn._gps.avg_lat, -45.866)
+        self.assertEqual(wn._WirelessClients[0]._gps.avg_lon, 171.008)
+
+    def test_lazy_matches_eager(self):
+        self.assertEqual(self.parse("etree", lazy=True), self.parse("etree"))
+
+    @unittest.skipIf(NetXML.LET is None, "lxml is not installed")
+    def test_lxml_matches_etree(self):
+        self.assertEqual(self.parse("lxml"), self.parse("etree"))
+
+    @unittest.skipIf(NetXML.LET is None, "lxml is not installed")
+    def test_lxml_matches_etree_lazy(self):
+        self.assertEqual(self.parse("lxml", lazy=True, lazy_dates=True),
+                         self.parse("etree", lazy=True, lazy_dates=True))
+
+class TestParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp_dir, "many.netxml")
+        with open(cls.path, "w") as f:
+            f.write(many_networks(40))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.min_size = NetXML._PARALLEL_MIN_SIZE
+        NetXML._PARALLEL_MIN_SIZE = 0
+
+    def tearDown(self):
+        NetXML._PARALLEL_MIN_SIZE = self.min_size
+
+    def serial(self):
+        netxml = NetXML.iterparse(self.path)
+        return [record_state(wn) for wn in netxml._WirelessNetworks]
+
+    def test_split_boundaries(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        (header_end, footer_start, ranges) = NetXML._split_netxml(self.path, 8)
+        self.assertEqual(len(ranges), 8)
+        self.assertEqual(ranges[0][0], header_end)
+        self.assertEqual(ranges[-1][1], footer_start)
+        self.assertTrue(data[footer_start:].startswith(b"</detection-run"))
+        networks = []
+        for (n, (start, end)) in enumerate(ranges):
+            self.assertTrue(data[start:].startswith(b"<wireless-network "))
+            if n:
+                self.assertEqual(start, ranges[n - 1][1])
+            document = NetXML._read_range(self.path, header_end, footer_start,
+                                          start, end)
+            networks.extend(
+                record_state(record) for record in
+                NetXML._iterrecords(io.BytesIO(document), NetXML._DECODER,
+                                    "etree")
+                if isinstance(record, NetXML.WirelessNetwork))
+        self.assertEqual(networks, self.serial())
+
+    def test_split_unsplittable(self):
+        path = os.path.join(self.tmp_dir, "empty.netxml")
+        with open(path, "w") as f:
+            f.write(SAMPLE_NETXML[:SAMPLE_NETXML.index("<wireless-network ")] +
+                    "</detection-run>\n")
+        self.assertIsNone(NetXML._split_netxml(path, 4))
+
+    def test_parallel_matches_serial(self):
+        netxml = NetXML.iterparse(self.path, workers=2)
+        self.assertEqual([record_state(wn) for wn in netxml._WirelessNetworks],
+                         self.serial())
+        self.assertIsNotNone(netxml.card_source)
+        self.assertEqual(set(wn.source for wn in netxml._WirelessNetworks),
+                         set([self.path]))
+
+    def test_parallel_lazy_decodes_eagerly(self):
+        netxml = NetXML.iterparse(self.path, workers=2, lazy=True)
+        self.assertTrue(all(wn._pending is None
+                            for wn in netxml._WirelessNetworks))
+        self.assertEqual([record_state(wn) for wn in netxml._WirelessNetworks],
+                         self.serial())
+
+class TestIterparseMany(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.paths = []
+        for (name, count) in (("a.netxml", 3), ("b.netxml", 5)):
+            path = os.path.join(cls.tmp_dir, name)
+            with open(path, "w") as f:
+                f.write(many_networks(count))
+            cls.paths.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def parse(self, **kwargs):
+        reports = []
+        def report(path, networks, size, seconds):
+            reports.append((path, networks, size))
+        networks = list(NetXML.iterparse_many(
+            os.path.join(self.tmp_dir, "*.netxml"), report=report, **kwargs))
+        return (networks, sorted(reports))
+
+    def check(self, networks, reports):
+        self.assertEqual(reports, [(path, count, os.path.getsize(path))
+                                   for (path, count) in zip(self.paths, (3, 5))])
+        by_source = {}
+        for wn in networks:
+            by_source.setdefault(wn.source, []).append(record_state(wn))
+            self.assertTrue(all(wc.source == wn.source for wc in wn))
+        for path in self.paths:
+            netxml = NetXML.iterparse(path)
+            self.assertEqual(by_source[path], [record_state(wn) for wn in
+                                               netxml._WirelessNetworks])
+
+    def test_serial(self):
+        (networks, reports) = self.parse()
+        self.assertEqual([wn.source for wn in networks],
+                         [self.paths[0]] * 3 + [self.paths[1]] * 5)
+        self.check(networks, reports)
+
+    def test_workers(self):
+        (networks, reports) = self.parse(workers=2, lazy=True)
+        self.check(networks, reports)
+
+    def test_paths_deduplicated(self):
+        networks = list(NetXML.iterparse_many(
+            [self.paths[0], os.path.join(self.tmp_dir, "a.*")]))
+        self.assertEqual(len(networks), 3)
+
+class TestEntities(unittest.TestCase):
+    """ External entities in a capture must never be read. """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        secret = os.path.join(self.tmp_dir, "secret.txt")
+        with open(secret, "w") as f:
+            f.write("TOPSECRET")
+        doctype = ('<!DOCTYPE detection-run [<!ENTITY secret SYSTEM "file://%s">]>'
+                   % secret)
+        self.path = os.path.join(self.tmp_dir, "entity.netxml")
+        with open(self.path, "w") as f:
+            f.write(SAMPLE_NETXML.replace(SAMPLE_NETXML.splitlines()[1], doctype)
+                    .replace("HomeNet &amp; Co", "&secret;"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def essids(self, backend):
+        netxml = NetXML.iterparse(self.path, backend=backend)
+        return [wn.ssid.essid for wn in netxml._WirelessNetworks]
+
+    def test_etree_rejects_external_entity(self):
+        with self.assertRaises(NetXML.ET.ParseError):
+            self.essids("etree")
+
+    @unittest.skipIf(NetXML.LET is None, "lxml is not installed")
+    def test_lxml_does_not_resolve_external_entity(self):
+        try:
+            essids = self.essids("lxml")
+        except NetXML.LET.XMLSyntaxError:
+            return
+        self.assertFalse(any("TOPSECRET" in (essid or "") for essid in essids))
+
+def index_state(netxml):
+    """ Return the built indexes of netxml as sets of record ids. """
+    return dict((field, dict((value, set(records))
+                             for (value, records) in index.items()))
+                for (field, index) in netxml._indexes.items())
+
+class TestIndexes(SampleTestCase):
+    def setUp(self):
+        self.netxml = NetXML.iterparse(self.path)
+        (self.wpa2, self.wep) = self.netxml._WirelessNetworks
+
+    def added(self):
+        """ Return a network from another file, channel 6 with one client. """
+        path = os.path.join(self.tmp_dir, "added.netxml")
+        with open(path, "w") as f:
+            f.write(many_networks(1))
+        wn = NetXML.iterparse(path)._WirelessNetworks[0]
+        del wn._WirelessClients[1:]
+        return wn
+
+    def assertIndexesRebuilt(self):
+        """ The maintained indexes must match indexes built from scratch. """
+        state = index_state(self.netxml)
+        self.netxml.reindex()
+        for field in state:
+            self.netxml._index(field)
+        self.assertEqual(index_state(self.netxml), state)
+
+    def test_by_bssid(self):
+        self.assertIs(self.netxml.by_bssid("E4:88:75:34:A2:0F"), self.wpa2)
+        self.assertIs(self.netxml.by_bssid("00:11:22:33:44:55"), self.wep)
+        self.assertIsNone(self.netxml.by_bssid("00:00:00:00:00:00"))
+        self.assertIs(self.netxml.by_client_mac("C9:57:56:74:06:66"),
+                      self.wpa2._WirelessClients[1])
+
+    def test_where(self):
+        self.assertEqual(self.netxml.where(channel=6),
+                         [self.wpa2] + self.wpa2._WirelessClients)
+        self.assertEqual(self.netxml.where(privacy="WEP", manuf="Netgear"),
+                         [self.wep])
+        self.assertEqual(self.netxml.where(channel=11, privacy="WPA2"), [])
+        self.assertEqual(self.netxml.where(essid="HomeNet & Co"), [self.wpa2])
+        self.assertEqual(self.netxml.where(), list(self.netxml))
+        with self.assertRaises(ValueError):
+            self.netxml.where(signal=-40)
+
+    def test_append_updates_indexes(self):
+        self.netxml.where(channel=6, privacy="WPA2")
+        wn = self.added()
+        self.netxml.append(wn)
+        self.assertEqual(self.netxml.where(channel=6, privacy="WPA2"),
+                         [self.wpa2, wn])
+        self.assertIs(self.netxml.by_client_mac(wn._WirelessClients[0].client_mac),
+                      self.wpa2._WirelessClients[0])
+        self.assertIndexesRebuilt()
+
+    def test_merge_updates_indexes(self):
+        self.netxml.where(channel=6, privacy="WPA2", essid="OldRouter")
+        spatial = self.netxml.spatial_index()
+        wn = self.added()
+        wn.bssid = self.wep.bssid
+        wn._WirelessClients[0].client_mac = "02:00:00:00:00:01"
+        self.netxml.merge(wn)
+        self.assertEqual(len(self.netxml.where(channel=6)), 4)
+        self.assertEqual(self.netxml.where(channel=11), [self.wep])
+        self.assertEqual(self.netxml.by_client_mac("02:00:00:00:00:01"),
+                         self.wep._WirelessClients[0])
+        self.assertIndexesRebuilt()
+        fresh = NetXML.SpatialIndex(self.netxml)
+        self.assertEqual(len(spatial), len(fresh))
+        self.assertEqual(spatial.within(-45.86, 170.5, 100000),
+                         fresh.within(-45.86, 170.5, 100000))
+
+    def test_reindex(self):
+        self.assertEqual(self.netxml.where(channel=11), [self.wep])
+        self.wep.channel = 1
+        self.assertEqual(self.netxml.where(channel=1), [])
+        self.netxml.reindex()
+        self.assertEqual(self.netxml.where(channel=1), [self.wep])
+        self.assertEqual(self.netxml.where(channel=11), [])
+
+class TestMerge(SampleTestCase):
+    def parse(self, **kwargs):
+        return NetXML.iterparse(self.path, **kwargs)
+
+    def test_packets_summed(self):
+        (netxml, other) = (self.parse(), self.parse())
+        netxml.merge(other)
+        netxml.merge(other)
+        self.assertEqual(len(netxml._WirelessNetworks), 2)
+        wn = netxml.by_bssid("E4:88:75:34:A2:0F")
+        self.assertEqual(wn._packets.total, 3 * 957)
+        self.assertEqual(wn.ssid.packets, 3 * 914)
+        self.assertEqual(wn.datasize, 3 * 30451)
+        self.assertEqual(wn.freqmhz, ["2437 60", "2442 9"])
+        self.assertEqual(len(wn._WirelessClients), 2)
+        self.assertEqual(wn._WirelessClients[0]._packets.total, 3 * 116)
+        # The merged observations are not modified
+        self.assertEqual([record_state(wn) for wn in other._WirelessNetworks],
+                         [record_state(wn) for wn in
+                          self.parse()._WirelessNetworks])
+
+    def test_copies_unseen_records(self):
+        (netxml, other) = (NetXML.NetXML(), self.parse())
+        netxml.merge(other)
+        netxml.merge(other)
+        wn = netxml._WirelessNetworks[0]
+        self.assertIsNot(wn, other._WirelessNetworks[0])
+        self.assertIsNot(wn._WirelessClients[0],
+                         other._WirelessNetworks[0]._WirelessClients[0])
+        self.assertEqual(other._WirelessNetworks[0]._packets.total, 957)
+        self.assertEqual(wn._packets.total, 2 * 957)
+
+    def test_clients_folded(self):
+        (netxml, other) = (self.parse(), self.parse())
+        observed = other.by_bssid("E4:88:75:34:A2:0F")
+        observed._WirelessClients[1].client_mac = "02:00:00:00:00:01"
+        netxml.merge(observed)
+        wn = netxml.by_bssid("E4:88:75:34:A2:0F")
+        self.assertEqual([wc.client_mac for wc in wn._WirelessClients],
+                         ["33:5F:97:3D:AA:D8", "C9:57:56:74:06:66",
+                          "02:00:00:00:00:01"])
+        self.assertEqual(wn._WirelessClients[0]._packets.total, 2 * 116)
+        self.assertEqual(wn._WirelessClients[1]._packets.total, 9)
+        self.assertIsNot(wn._WirelessClients[2], observed._WirelessClients[1])
+        # A lone client folds into the client of the same MAC under a network
+        wc = self.parse()._WirelessNetworks[0]._WirelessClients[1]
+        self.assertIs(netxml.merge(wc), wn._WirelessClients[1])
+        self.assertEqual(wn._WirelessClients[1]._packets.total, 2 * 9)
+        self.assertEqual(netxml._WirelessClients, [])
+
+    def test_compact_and_string_keys(self):
+        netxml = self.parse()
+        netxml.merge(self.parse(compact=True))
+        other = self.parse()
+        for wn in other._WirelessNetworks:
+            wn.bssid = wn.bssid.lower().replace(":", "-")
+            for wc in wn:
+                wc.client_mac = wc.client_mac.lower()
+        netxml.merge(other)
+        self.assertEqual(len(netxml._WirelessNetworks), 2)
+        wn = netxml._WirelessNetworks[0]
+        self.assertEqual(len(wn._WirelessClients), 2)
+        self.assertEqual(wn._packets.total, 3 * 957)
+        self.assertEqual(wn._WirelessClients[0]._packets.total, 3 * 116)
+
+    def test_privacy_after_merge(self):
+        netxml = self.parse()
+        self.assertEqual(netxml.where(privacy="WEP"),
+                         [netxml._WirelessNetworks[1]])
+        observed = self.parse().by_bssid("E4:88:75:34:A2:0F")
+        observed.bssid = "00:11:22:33:44:55"
+        wn = netxml.merge(observed)
+        self.assertEqual(wn.ssid.encryption, ["WEP", "WPA+PSK", "WPA+AES-CCM"])
+        self.assertEqual((wn.ssid.privacy, wn.ssid.cipher,
+                          wn.ssid.authentication), ("WPA2", "AES-CCMP", "PSK"))
+        self.assertEqual(netxml.where(privacy="WEP"), [])
+        self.assertEqual(netxml.where(privacy="WPA2"),
+                         [netxml._WirelessNetworks[0], wn])
+
+def located(lat, lon, extent=0.0):
+    """ Return a WirelessNetwork positioned at (lat, lon), with a GPS min/max
+        box extent degrees either side. """
+    wn = NetXML.WirelessNetwork()
+    wn._gps = NetXML.GPSInfoObject(avg_lat=lat, avg_lon=lon,
+                                   min_lat=lat - extent, min_lon=lon - extent,
+                                   max_lat=lat + extent, max_lon=lon + extent)
+    return wn
+
+class TestSpatialIndex(unittest.TestCase):
+    def brute_within(self, records, lat, lon, metres):
+        return sorted((NetXML._haversine(lat, lon, wn._gps.avg_lat,
+                                         wn._gps.avg_lon), id(wn))
+                      for wn in records
+                      if NetXML._haversine(lat, lon, wn._gps.avg_lat,
+                                           wn._gps.avg_lon) <= metres)
+
+    def brute_nearest(self, records, lat, lon, k):
+        return sorted(NetXML._haversine(lat, lon, wn._gps.avg_lat,
+                                        wn._gps.avg_lon)
+                      for wn in records)[:k]
+
+    def check(self, index, records, lat, lon, metres, k):
+        self.assertEqual([(d, id(wn)) for (d, wn) in
+                          index.within(lat, lon, metres)],
+                         self.brute_within(records, lat, lon, metres))
+        self.assertEqual([d for (d, wn) in index.nearest(lat, lon, k)],
+                         self.brute_nearest(records, lat, lon, k))
+
+    def test_bbox(self):
+        records = [located(-45.87, 170.50, 0.02), located(-45.80, 170.55),
+                   located(-46.50, 170.50)]
+        records.append(NetXML.WirelessNetwork())
+        index = NetXML.SpatialIndex(records)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.bbox(-45.90, 170.40, -45.80, 170.60),
+                         records[:2])
+        self.assertEqual(index.bbox(-45.86, 170.51, -45.80, 170.60),
+                         [records[1]])
+        self.assertEqual(index.bbox(-45.86, 170.51, -45.80, 170.60,
+                                    extent=True), records[:2])
+        self.assertEqual(index.bbox(10.0, 10.0, 11.0, 11.0), [])
+
+    def test_within_and_nearest(self):
+        rnd = random.Random(1)
+        records = [located(rnd.uniform(-45.9, -45.8),
+                           rnd.uniform(170.4, 170.6)) for n in range(200)]
+        index = NetXML.SpatialIndex(records)
+        for n in range(50):
+            self.check(index, records, rnd.uniform(-46.0, -45.7),
+                       rnd.uniform(170.3, 170.7), rnd.choice([50, 500, 5000]),
+                       rnd.choice([1, 5, 20]))
+        self.assertEqual(index.nearest(-45.85, 170.5, k=0), [])
+        self.assertEqual(len(index.nearest(-45.85, 170.5, k=500)), 200)
+
+    def test_antimeridian(self):
+        (east, west) = (located(-16.0, 179.999), located(-16.0, -179.999))
+        records = [east, west, located(-16.0, 179.0), located(-16.0, -179.0)]
+        index = NetXML.SpatialIndex(records)
+        self.assertEqual([wn for (d, wn) in index.within(-16.0, 179.9995, 500)],
+                         [east, west])
+        self.assertEqual([wn for (d, wn) in index.nearest(-16.0, -179.9999, 2)],
+                         [west, east])
+        self.assertEqual(index.bbox(-17.0, 179.5, -15.0, -179.5), [east, west])
+        for lon in (179.95, -179.95, 179.5, -179.5):
+            self.check(index, records, -16.0, lon, 150000, 3)
+
+    def test_poles(self):
+        rnd = random.Random(2)
+        records = [located(rnd.choice([1, -1]) * rnd.uniform(89.9, 90.0),
+                           rnd.uniform(-180.0, 180.0)) for n in range(100)]
+        index = NetXML.SpatialIndex(records)
+        for n in range(20):
+            self.check(index, records,
+                       rnd.choice([1, -1]) * rnd.uniform(89.95, 90.0),
+                       rnd.uniform(-180.0, 180.0),
+                       rnd.choice([100, 2000, 20000]), rnd.choice([1, 10]))
+
+    def test_remove(self):
+        records = [located(-45.87, 170.50), located(-45.87, 170.50)]
+        index = NetXML.SpatialIndex(records)
+        index.remove(records[0])
+        index.remove(records[0])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.bbox(-46.0, 170.0, -45.0, 171.0), records[1:])
+
+def column_values(column):
+    """ Return a NumPy column as a list, None for missing values. """
+    if isinstance(column, NetXML.Categorical):
+        return [column.categories[code] if code >= 0 else None
+                for code in column.codes.tolist()]
+    if column.dtype.kind == "M":
+        return column.view("int64").tolist()
+    return [None if value != value else value for value in column.tolist()]
+
+@unittest.skipIf(NetXML.np is None, "numpy is not installed")
+class TestColumns(SampleTestCase):
+    def assertColumnsEqual(self, columns, expected):
+        self.assertEqual(sorted(columns), sorted(expected))
+        for name in expected:
+            self.assertEqual(column_values(columns[name]),
+                             column_values(expected[name]), name)
+
+    def test_sample_columns(self):
+        columns = NetXML.iterparse(self.path, columnar=True)
+        self.assertEqual(column_values(columns["netxml_type"]),
+                         ["network", "client", "client", "network"])
+        self.assertEqual(column_values(columns["bssid"]),
+                         ["E4:88:75:34:A2:0F"] * 3 + ["00:11:22:33:44:55"])
+        self.assertEqual(column_values(columns["client_mac"]),
+                         [None, "33:5F:97:3D:AA:D8", "C9:57:56:74:06:66", None])
+        self.assertEqual(column_values(columns["network_number"]),
+                         [None, 1.0, 1.0, None])
+        self.assertEqual(column_values(columns["packets_total"]),
+                         [957.0, 116.0, 9.0, 20.0])
+        self.assertEqual(column_values(columns["avg_lat"]),
+                         [-45.866, -45.861, None, None])
+        self.assertEqual(column_values(columns["privacy"]),
+                         ["WPA2", None, None, "WEP"])
+
+    def test_streaming_matches_objects(self):
+        path = os.path.join(self.tmp_dir, "many.netxml")
+        with open(path, "w") as f:
+            f.write(many_networks(7))
+        for path in (self.path, path):
+            self.assertColumnsEqual(NetXML.iterparse(path, columnar=True),
+                                    NetXML.iterparse(path).to_columns())
+
+    def test_filtered_streaming_matches_objects(self):
+        filters = NetXML.NetworkFilter(channels=[6],
+                                       client_macs=["33:5F:97:3D:AA:D8"])
+        self.assertColumnsEqual(
+            NetXML.iterparse(self.path, columnar=True, filters=filters),
+            NetXML.iterparse(self.path, filters=filters).to_columns())
+
+    def test_aggregate(self):
+        path = os.path.join(self.tmp_dir, "aggregate.netxml")
+        with open(path, "w") as f:
+            f.write(AGGREGATE_NETXML)
+        columns = NetXML.iterparse(path, columnar=True)
+        stats = NetXML.aggregate(columns, "channel")
+        self.assertEqual(stats["channel"], [1.0, None])
+        self.assertEqual(column_values(stats["count"]), [2, 1])
+        self.assertEqual(column_values(stats["max_signal_dbm_mean"]),
+                         [-50.0, None])
+        self.assertEqual(column_values(stats["max_signal_dbm_min"]),
+                         [-60.0, None])
+        self.assertEqual(column_values(stats["max_signal_dbm_max"]),
+                         [-40.0, None])
+        self.assertEqual(column_values(stats["packets_total"]), [150.0, 0.0])
+        self.assertEqual(column_values(stats["packets_crypt"]), [80.0, 0.0])
+        self.assertEqual(column_values(stats["retry_ratio"]),
+                         [10.0 / 150.0, None])
+        stats = NetXML.aggregate(columns, "privacy", netxml_type=None)
+        self.assertEqual(stats["privacy"], ["WEP", None])
+        self.assertEqual(column_values(stats["count"]), [2, 2])
+        self.assertEqual(column_values(stats["max_signal_dbm_max"]),
+                         [-40.0, -10.0])
+        stats = NetXML.aggregate(columns, "manuf", netxml_type="client")
+        self.assertEqual(stats["manuf"], [None])
+        with self.assertRaises(ValueError):
+            NetXML.aggregate(columns, "first_time")
+
+class TestColumnStore(SampleTestCase):
+    def setUp(self):
+        self.store = os.path.join(self.tmp_dir, "sample.store")
+        NetXML.write_store(self.path, self.store)
+
+    def test_rows(self):
+        netxml = NetXML.iterparse(self.path)
+        copy = os.path.join(self.tmp_dir, "copy.store")
+        netxml.to_store(copy)
+        with open(self.store, "rb") as f, open(copy, "rb") as g:
+            self.assertEqual(f.read(), g.read())
+        with NetXML.open_store(self.store) as store:
+            self.assertEqual(len(store), 4)
+            self.assertEqual(list(store.column("packets_total")),
+                             [957.0, 116.0, 9.0, 20.0])
+            for (row, record) in zip(store, netxml):
+                self.assertEqual(row["netxml_type"], record.netxml_type)
+                self.assertEqual(row["first_time"], record.first_time)
+                self.assertEqual(row["channel"], record.channel)
+            self.assertEqual(store[0]["essid"], "HomeNet & Co")
+            self.assertEqual(store[-1]["bssid"], "00:11:22:33:44:55")
+            self.assertIsNone(store[-1]["avg_lat"])
+            with self.assertRaises(IndexError):
+                store.row(4)
+
+    def test_not_a_store(self):
+        with self.assertRaises(ValueError):
+            NetXML.open_store(self.path)
+        empty = os.path.join(self.tmp_dir, "empty.store")
+        open(empty, "w").close()
+        with self.assertRaises(ValueError):
+            NetXML.open_store(empty)
+
+    @unittest.skipIf(NetXML.np is None, "numpy is not installed")
+    def test_matches_to_columns(self):
+        columns = NetXML.iterparse(self.path).to_columns()
+        with NetXML.open_store(self.store) as store:
+            self.assertEqual(sorted(store.names()), sorted(columns))
+            for (name, expected) in columns.items():
+                if isinstance(expected, NetXML.Categorical):
+                    values = [store.string(number)
+                              for number in store.column(name)]
+                else:
+                    values = column_values(store.array(name))
+                self.assertEqual(values, column_values(expected), name)
+
+    @unittest.skipIf(NetXML.np is None, "numpy is not installed")
+    def test_close_with_live_array(self):
+        store = NetXML.open_store(self.store)
+        channel = store.array("channel")
+        store.close()
+        self.assertTrue(store._fh.closed)
+        self.assertEqual(channel.tolist(), [6.0, 6.0, 6.0, 11.0])
+
+class TestFollower(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "live.netxml")
+        document = many_networks(3)
+        self.blocks = re.findall(r"<wireless-network .*?</wireless-network>\n",
+                                 document, re.S)
+        self.head = document[:document.index(self.blocks[0])]
+        self.follower = NetXML.Follower(self.path)
+        self.mtime = 1500000000 * 10 ** 9
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def touch(self):
+        """ Give every write its own mtime, which may otherwise not change
+            between quick writes. """
+        self.mtime += 10 ** 9
+        os.utime(self.path, ns=(self.mtime, self.mtime))
+
+    def write(self, blocks, complete=True):
+        """ Rewrite the file in place, keeping its inode. """
+        with open(self.path, "r+" if os.path.exists(self.path) else "w") as f:
+            f.write(self.head + "".join(blocks))
+            if complete:
+                f.write("</detection-run>\n")
+            f.truncate()
+        self.touch()
+
+    def append(self, blocks, complete=True):
+        with open(self.path, "a") as f:
+            f.write("".join(blocks))
+            if complete:
+                f.write("</detection-run>\n")
+        self.touch()
+
+    def updated(self, block):
+        """ Return a block with a new last-time of the same length. """
+        return block.replace("20:24:50", "20:24:59", 1)
+
+    def poll(self):
+        return [(event.event, getattr(event.record, "bssid", None) or
+                 event.record.client_mac) for event in self.follower.poll()]
+
+    def test_new_updated_removed(self):
+        self.write(self.blocks[:2])
+        self.assertEqual(self.poll(), [("new", "02:00:00:00:00:00"),
+                                       ("new", "33:5F:97:3D:AA:D8"),
+                                       ("new", "C9:57:56:74:06:66"),
+                                       ("new", "02:00:00:00:00:01")])
+        self.assertEqual(self.poll(), [])
+        self.write([self.blocks[0], self.blocks[1].replace("09:45:12",
+                                                          "09:45:13")])
+        self.assertEqual(self.poll(), [("updated", "02:00:00:00:00:01")])
+        self.write([self.blocks[1].replace("09:45:12", "09:45:13")])
+        self.assertEqual(self.poll(), [("removed", "02:00:00:00:00:00")])
+        self.assertEqual(sorted(self.follower.networks), ["02:00:00:00:00:01"])
+
+    def test_append(self):
+        self.write(self.blocks[:1], complete=False)
+        self.assertEqual(len(self.poll()), 3)
+        self.append(self.blocks[1:2], complete=False)
+        self.assertEqual(self.poll(), [("new", "02:00:00:00:00:01")])
+        self.append(self.blocks[2:])
+        self.assertEqual([event for (event, mac) in self.poll()],
+                         ["new"] * 3)
+        self.assertEqual(len(self.follower.networks), 3)
+
+    def test_same_length_rewrite(self):
+        self.write(self.blocks[:2], complete=False)
+        self.assertEqual(len(self.poll()), 4)
+        # Earlier bytes change without changing the file length before the
+        # previous end of scan, and the file grows
+        self.write([self.updated(self.blocks[0])] + self.blocks[1:],
+                   complete=False)
+        self.assertEqual(self.poll(), [("updated", "02:00:00:00:00:00"),
+                                       ("new", "02:00:00:00:00:02"),
+                                       ("new", "33:5F:97:3D:AA:D8"),
+                                       ("new", "C9:57:56:74:06:66")])
+
+    def test_missing_file(self):
+        self.assertEqual(self.poll(), [])
+
+class TestFeedParser(SampleTestCase):
+    def setUp(self):
+        with open(self.path, "rb") as f:
+            self.data = f.read()
+        self.expected = [record_state(wn) for wn in NetXML.iterstream(self.path)]
+
+    def test_small_chunks(self):
+        (called, delivered) = ([], queue.Queue())
+        parser = NetXML.FeedParser(callback=called.append, queue=delivered)
+        networks = []
+        for i in range(0, len(self.data), 7):
+            networks.extend(parser.feed(self.data[i:i + 7]))
+        networks.extend(parser.close())
+        self.assertEqual([record_state(wn) for wn in networks], self.expected)
+        self.assertEqual(called, networks)
+        self.assertEqual([delivered.get_nowait() for wn in networks], networks)
+        self.assertEqual(parser.card_source.card_name, "wlan0")
+
+    def test_networks_returned_when_complete(self):
+        parser = NetXML.FeedParser()
+        end = self.data.index(b"</wireless-network>")
+        self.assertEqual(parser.feed(self.data[:end]), [])
+        self.assertEqual(len(parser.feed(self.data[end:])), 2)
+
+    def test_truncated(self):
+        parser = NetXML.FeedParser()
+        parser.feed(self.data[:len(self.data) // 2])
+        with self.assertRaises(NetXML.ET.ParseError):
+            parser.close()
+
+    def test_file_object(self):
+        with open(self.path, "rb") as f:
+            networks = list(NetXML.iterstream(f))
+        self.assertEqual([record_state(wn) for wn in networks], self.expected)
+
+class TestCompressed(SampleTestCase):
+    def setUp(self):
+        with open(self.path, "rb") as f:
+            self.data = f.read()
+        self.codecs = [(".gz", gzip.compress), (".bz2", bz2.compress),
+                       (".xz", lzma.compress)]
+        if NetXML.zstandard is not None:
+            self.codecs.append((".zst",
+                                NetXML.zstandard.ZstdCompressor().compress))
+
+    def compressed(self, ext, compress, data, name="sample.netxml"):
+        path = os.path.join(self.tmp_dir, name + ext)
+        with open(path, "wb") as f:
+            f.write(compress(data))
+        return path
+
+    def test_round_trip(self):
+        expected = [record_state(wn) for wn in NetXML.iterstream(self.path)]
+        for (ext, compress) in self.codecs:
+            path = self.compressed(ext, compress, self.data)
+            self.assertEqual([record_state(wn) for wn in
+                              NetXML.iterstream(path)], expected, ext)
+            with NetXML._open_input(path) as f:
+                self.assertEqual(f.read(), self.data, ext)
+
+    def test_truncated(self):
+        for (ext, compress) in self.codecs:
+            path = os.path.join(self.tmp_dir, "truncated.netxml" + ext)
+            data = compress(self.data)
+            with open(path, "wb") as f:
+                f.write(data[:len(data) // 2])
+            with self.assertRaises((EOFError, NetXML.ET.ParseError), msg=ext):
+                list(NetXML.iterstream(path))
+
+    def test_close_mid_stream(self):
+        data = many_networks(2000).encode("ascii")
+        for (ext, compress) in self.codecs:
+            path = self.compressed(ext, compress, data, "many.netxml")
+            before = set(threading.enumerate())
+            networks = NetXML.iterstream(path)
+            next(networks)
+            readers = set(threading.enumerate()) - before
+            self.assertTrue(readers, ext)
+            networks.close()
+            self.assertFalse(any(thread.is_alive() for thread in readers), ext)
+
+class TestMACFilter(SampleTestCase):
+    def test_formats(self):
+        macs = NetXML.MACFilter(["E4:88:75:34:A2:0F", 0x001122334455])
+        for mac in ("E4:88:75:34:A2:0F", "e4:88:75:34:a2:0f",
+                    "E4-88-75-34-A2-0F", "e488.7534.a20f", "E48875 34A20F",
+                    "E4887534A20F", 0xE4887534A20F, "00:11:22:33:44:55"):
+            self.assertIn(mac, macs)
+        for mac in ("E4:88:75:34:A2:0E", "E4:88:75:34:A2", "not a mac", None,
+                    1 << 48, -1):
+            self.assertNotIn(mac, macs)
+        self.assertEqual(len(macs), 2)
+
+    def test_oui_wildcards(self):
+        macs = NetXML.MACFilter(["E4:88:75:*", "00-11-22"])
+        self.assertIn("e4:88:75:00:00:00", macs)
+        self.assertIn("00:11:22:33:44:55", macs)
+        self.assertNotIn("E4:88:76:34:A2:0F", macs)
+        self.assertNotIn("E4:88:75", macs)
+        self.assertEqual(len(macs), 2)
+        for mac in ("E4:88:*", "ZZ:ZZ:ZZ:*", "00:11:22:33", 1 << 48):
+            with self.assertRaises(ValueError):
+                NetXML.MACFilter([mac])
+
+    def test_from_file(self):
+        path = os.path.join(self.tmp_dir, "known.txt")
+        with open(path, "w") as f:
+            f.write("# Known devices\n\n"
+                    "  e4-88-75-34-a2-0f   office access point\n"
+                    "\t\n"
+                    "33:5F:97:*\n"
+                    "#00:11:22:33:44:55\n")
+        macs = NetXML.MACFilter.from_file(path)
+        self.assertEqual(len(macs), 2)
+        self.assertIn("E4:88:75:34:A2:0F", macs)
+        self.assertIn("33:5F:97:3D:AA:D8", macs)
+        self.assertNotIn("00:11:22:33:44:55", macs)
+
+    def test_network_filter(self):
+        known = NetXML.MACFilter(["e4:88:75:*"])
+        networks = list(NetXML.iterstream(
+            self.path, filters=NetXML.NetworkFilter(
+                exclude_bssids=known, exclude_client_macs=["33-5f-97-3d-aa-d8"])))
+        self.assertEqual([wn.bssid for wn in networks], ["00:11:22:33:44:55"])
+        networks = list(NetXML.iterstream(
+            self.path, filters=NetXML.NetworkFilter(
+                bssids=known, exclude_client_macs=["33-5f-97-3d-aa-d8"])))
+        self.assertEqual([wc.client_mac for wc in networks[0]],
+                         ["C9:57:56:74:06:66"])
+
+class TestCompact(SampleTestCase):
+    def test_mac_conversion(self):
+        self.assertEqual(NetXML.mac_to_int("e4-88-75-34-a2-0f"), 0xE4887534A20F)
+        self.assertEqual(NetXML.int_to_mac(0xE4887534A20F), "E4:88:75:34:A2:0F")
+        self.assertEqual(NetXML.int_to_mac(0x000000000001), "00:00:00:00:00:01")
+        for mac in ("E4:88:75:34:A2", "not a mac", 1 << 48):
+            with self.assertRaises(ValueError):
+                NetXML.mac_to_int(mac)
+
+    def test_compact_records(self):
+        path = os.path.join(self.tmp_dir, "lower.netxml")
+        with open(path, "w") as f:
+            f.write(many_networks(4).replace("33:5F:97:3D:AA:D8",
+                                             "33:5f:97:3d:aa:d8"))
+        (plain, compact) = (NetXML.iterparse(path),
+                            NetXML.iterparse(path, compact=True))
+        for (wn, cwn) in zip(plain._WirelessNetworks, compact._WirelessNetworks):
+            self.assertIsInstance(cwn._bssid, int)
+            self.assertEqual(cwn.bssid, wn.bssid)
+            self.assertEqual(cwn.bssid_int, NetXML.mac_to_int(wn.bssid))
+            self.assertEqual(cwn.ssid.essid, wn.ssid.essid)
+            self.assertEqual(cwn.ssid.privacy, wn.ssid.privacy)
+            for (wc, cwc) in zip(wn, cwn):
+                self.assertIsInstance(cwc._client_mac, int)
+                self.assertEqual(cwc.client_mac, wc.client_mac.upper())
+                self.assertEqual(cwc.client_mac_int,
+                                 NetXML.mac_to_int(wc.client_mac))
+        # Equal strings are interned, so records share one copy
+        (a, b) = (compact._WirelessNetworks[0], compact._WirelessNetworks[2])
+        self.assertIs(a._manuf, b._manuf)
+        self.assertIs(a.ssid._essid, b.ssid._essid)
+        self.assertIs(a.ssid._encryption[0], b.ssid._encryption[0])
+        self.assertIs(a._WirelessClients[0]._client_manuf,
+                      b._WirelessClients[0]._client_manuf)
+        self.assertEqual(compact.by_bssid("02:00:00:00:00:02"), b)
+
+    def test_not_a_mac_kept(self):
+        path = os.path.join(self.tmp_dir, "bad.netxml")
+        with open(path, "w") as f:
+            f.write(SAMPLE_NETXML.replace("00:11:22:33:44:55", "unknown"))
+        netxml = NetXML.iterparse(path, compact=True)
+        self.assertEqual(netxml._WirelessNetworks[1].bssid, "unknown")
+        self.assertIsNone(netxml._WirelessNetworks[1].bssid_int)
+
+class TestCache(SampleTestCase):
+    def setUp(self):
+        self.cache_dir = os.path.join(tempfile.mkdtemp(dir=self.tmp_dir), "cache")
+
+    def cached(self):
+        return [name for name in os.listdir(self.cache_dir)
+                if name.endswith(NetXML._CACHE_SUFFIX)]
+
+    def test_not_cached_by_default(self):
+        os.environ["NETXML_CACHE_DIR"] = self.cache_dir
+        try:
+            NetXML.iterparse(self.path)
+        finally:
+            del os.environ["NETXML_CACHE_DIR"]
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_cache_round_trip(self):
+        first = NetXML.iterparse(self.path, cache=self.cache_dir)
+        self.assertEqual(len(self.cached()), 1)
+        self.assertEqual(os.stat(self.cache_dir).st_mode & 0o777, 0o700)
+        second = NetXML.iterparse(self.path, cache=self.cache_dir)
+        self.assertEqual([record_state(wn) for wn in second._WirelessNetworks],
+                         [record_state(wn) for wn in first._WirelessNetworks])
+
+    def test_cache_key(self):
+        key = NetXML._cache_key(self.path)
+        self.assertEqual(NetXML._cache_key(self.path), key)
+        copy = os.path.join(self.tmp_dir, "copy.netxml")
+        shutil.copy2(self.path, copy)
+        self.assertNotEqual(NetXML._cache_key(copy), key)
+        with open(copy, "a") as f:
+            f.write("\n")
+        self.assertNotEqual(NetXML._cache_key(copy), key)
+
+    def test_untrusted_cache_dir_not_loaded(self):
+        NetXML.iterparse(self.path, cache=self.cache_dir)
+        path = os.path.join(self.cache_dir, self.cached()[0])
+        os.chmod(self.cache_dir, 0o777)
+        self.assertIsNone(NetXML._cache_load(path))
+        os.chmod(self.cache_dir, 0o700)
+        self.assertIsNotNone(NetXML._cache_load(path))
+
+if __name__ == "__main__":
+    unittest.main()